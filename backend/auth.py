@@ -1,11 +1,13 @@
+import functools
+import hashlib
 import os
 import secrets
+from datetime import datetime, timezone
 from pathlib import Path
 from flask import session, request, redirect, url_for
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-from google_auth_oauthlib.flow import Flow
 from dotenv import load_dotenv
+from clients import get_http_session, get_spotify_session
+from credentials import CredentialManager
 
 # Load .env from root directory (parent of backend)
 env_path = Path(__file__).parent.parent / '.env'
@@ -28,12 +30,16 @@ GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
 
 def get_spotify_oauth():
     """Create Spotify OAuth handler"""
+    # spotipy and google_auth_oauthlib are slow to import; load them on first use
+    from spotipy.cache_handler import MemoryCacheHandler
+    from spotipy.oauth2 import SpotifyOAuth
     return SpotifyOAuth(
         client_id=SPOTIFY_CLIENT_ID,
         client_secret=SPOTIFY_CLIENT_SECRET,
         redirect_uri=SPOTIFY_REDIRECT_URI,
         scope=SPOTIFY_SCOPE,
-        cache_handler=None  # We'll handle tokens in session
+        # We handle tokens in the session; the default handler shares a .cache file between users
+        cache_handler=MemoryCacheHandler()
     )
 
 
@@ -55,6 +61,7 @@ def get_youtube_oauth_flow():
             "redirect_uris": [YOUTUBE_REDIRECT_URI]
         }
     }
+    from google_auth_oauthlib.flow import Flow
     flow = Flow.from_client_config(
         client_config,
         scopes=YOUTUBE_SCOPES,
@@ -63,34 +70,143 @@ def get_youtube_oauth_flow():
     return flow
 
 
+def spotify_user_key(token_info):
+    """Stable, non-reversible key identifying the Spotify user behind a token"""
+    secret = token_info.get('refresh_token') or token_info['access_token']
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
 def generate_state_token():
     """Generate a random state token for OAuth"""
     return secrets.token_urlsafe(32)
 
 
-def get_spotify_client(token_info):
-    """Get Spotify client with access token"""
-    return spotipy.Spotify(auth=token_info['access_token'])
+# ===== TOKEN REFRESH =====
 
+@functools.cache
+def _spotify_refresher():
+    # One handler for every refresh, so they share its connection pool
+    return get_spotify_oauth()
 
-def is_spotify_authenticated():
-    """Check if user is authenticated with Spotify"""
-    token_info = session.get('spotify_token_info')
-    if not token_info:
+
+def _refresh_spotify(token_info):
+    return _spotify_refresher().refresh_access_token(token_info['refresh_token'])
+
+
+spotify_credentials = CredentialManager(
+    'spotify', _refresh_spotify,
+    expires_at=lambda token_info: token_info.get('expires_at'),
+    refresh_token=lambda token_info: token_info.get('refresh_token')
+)
+
+
+def youtube_credentials_dict(creds, channel_id=None):
+    """Session form of Google OAuth2 credentials; channel_id identifies the user across logins"""
+    return {
+        'token': creds.token,
+        'refresh_token': creds.refresh_token,
+        'token_uri': creds.token_uri,
+        'client_id': creds.client_id,
+        'client_secret': creds.client_secret,
+        'scopes': list(creds.scopes or YOUTUBE_SCOPES),
+        # Epoch seconds; google-auth keeps expiry as a naive UTC datetime
+        'expires_at': creds.expiry.replace(tzinfo=timezone.utc).timestamp() if creds.expiry else None,
+        'channel_id': channel_id
+    }
+
+
+@functools.cache
+def _persisting_credentials_class():
+    # Defined on first use so google.oauth2 (slow to import) loads with the first YouTube client
+    from google.oauth2.credentials import Credentials
+
+    class PersistingCredentials(Credentials):
+        """Credentials that store their new tokens whenever google-auth refreshes them mid-transfer"""
+
+        channel_id = None
+
+        def refresh(self, request):
+            super().refresh(request)
+            youtube_credentials.save(youtube_credentials_dict(self, self.channel_id))
+
+    return PersistingCredentials
+
+
+def google_credentials(credentials, persist=True):
+    """Build Google OAuth2 Credentials from the session dict"""
+    from google.oauth2.credentials import Credentials
+    cls = _persisting_credentials_class() if persist else Credentials
+    expires_at = credentials.get('expires_at')
+    creds = cls(
+        token=credentials['token'],
+        refresh_token=credentials.get('refresh_token'),
+        token_uri=credentials.get('token_uri', 'https://oauth2.googleapis.com/token'),
+        client_id=credentials['client_id'],
+        client_secret=credentials['client_secret'],
+        scopes=credentials.get('scopes', YOUTUBE_SCOPES),
+        expiry=datetime.fromtimestamp(expires_at, timezone.utc).replace(tzinfo=None) if expires_at else None
+    )
+    if persist:
+        creds.channel_id = credentials.get('channel_id')
+    return creds
+
+
+def _refresh_youtube(credentials):
+    from google.auth.transport.requests import Request
+    creds = google_credentials(credentials, persist=False)
+    creds.refresh(Request(session=get_http_session()))
+    return youtube_credentials_dict(creds, credentials.get('channel_id'))
+
+
+youtube_credentials = CredentialManager(
+    'youtube', _refresh_youtube,
+    expires_at=lambda credentials: credentials.get('expires_at'),
+    refresh_token=lambda credentials: credentials.get('refresh_token')
+)
+
+
+class _SpotifyTokenManager:
+    """spotipy auth manager that hands out the user's current access token"""
+
+    def __init__(self, token_info):
+        self.token_info = token_info
+
+    def get_access_token(self, as_dict=False):
+        self.token_info = spotify_credentials.current(self.token_info)
+        return self.token_info if as_dict else self.token_info['access_token']
+
+
+def _fresh_session_credentials(name, manager):
+    # Refresh the session's credentials if due, writing new tokens back to the session
+    credentials = session.get(name)
+    if not credentials:
         return False
-    
-    # Check if token is expired
-    sp_oauth = get_spotify_oauth()
-    if sp_oauth.is_token_expired(token_info):
-        try:
-            token_info = sp_oauth.refresh_access_token(token_info['refresh_token'])
-            session['spotify_token_info'] = token_info
-            return True
-        except:
-            return False
+    try:
+        fresh = manager.current(credentials)
+    except Exception:
+        return False
+    if fresh is not credentials:
+        session[name] = fresh
+        session.modified = True
     return True
 
 
+def get_spotify_client(token_info):
+    """
+    Get Spotify client for a user, sharing the pooled Spotify session.
+    
+    The access token is checked before every call, so a long background
+    transfer keeps working after the token it started with expires.
+    """
+    import spotipy
+    return spotipy.Spotify(auth_manager=_SpotifyTokenManager(token_info), requests_session=get_spotify_session())
+
+
+def is_spotify_authenticated():
+    """Check if user is authenticated with Spotify, refreshing the token if it is due"""
+    return _fresh_session_credentials('spotify_token_info', spotify_credentials)
+
+
 def is_youtube_authenticated():
-    """Check if user is authenticated with YouTube"""
-    return 'youtube_credentials' in session
+    """Check if user is authenticated with YouTube, refreshing the token if it is due"""
+    return _fresh_session_credentials('youtube_credentials', youtube_credentials)
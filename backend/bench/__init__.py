@@ -0,0 +1,23 @@
+"""
+Offline transfer benchmarks.
+
+Run from the backend directory:
+
+    python -m bench --sizes 100,1000,10000
+
+Spotify and the YouTube Data API are replaced at the transport level (a
+requests adapter and an httplib2-style object), so spotipy and
+googleapiclient still build, send and parse every request. YouTube Music
+search is replaced by a YTMusic stand-in. Every stand-in sleeps for a
+configurable latency.
+"""
+import os
+import tempfile
+
+# Keep benchmark state away from the real data directory and the real quota
+# ledger; this must run before any backend module reads its configuration
+_data_dir = tempfile.mkdtemp(prefix='stoy-bench-')
+os.environ.setdefault('STATE_BACKEND', 'memory')
+os.environ.setdefault('MATCH_CACHE_PATH', os.path.join(_data_dir, 'match_cache.db'))
+os.environ.setdefault('MANIFEST_PATH', os.path.join(_data_dir, 'manifests.db'))
+os.environ.setdefault('YOUTUBE_DAILY_QUOTA', str(10 ** 12))
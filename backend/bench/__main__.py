@@ -0,0 +1,199 @@
+import argparse
+import contextlib
+import io
+import json
+import secrets
+import time
+import tracemalloc
+
+import spotipy
+from googleapiclient.discovery import build_from_document
+
+from bench.fakes import (
+    Timings, synthetic_tracks, SpotifyStub, spotify_session, FakeYTMusic, YouTubeStub
+)
+from clients import _get_youtube_document
+from playlist_index import get_playlist_index
+from quota import youtube_quota, metered_request_builder
+from spotify import Track, get_playlist_tracks_oauth, iter_playlist_tracks
+from ytm import get_video_ids, create_ytm_playlist_oauth
+
+
+class Recorder:
+    """Stands in for a TransferJob and times each track through the search and insert stages"""
+
+    def __init__(self, timings):
+        self.timings = timings
+        self.quota_units = 0
+        self.inserted = 0
+        self.pulled = {}
+        self.searched = {}
+
+    def feed(self, tracks):
+        """Wrap a track iterable, noting when each track enters the pipeline"""
+        for track in tracks:
+            self.pulled[track.label] = time.perf_counter()
+            yield track
+
+    def _searched(self, name, video_id=None):
+        now = time.perf_counter()
+        if name in self.pulled:
+            self.timings.add('search', now - self.pulled[name])
+        if video_id:
+            self.searched[video_id] = now
+
+    def track_searched(self, missed_track=None, track=None, video_id=None):
+        self._searched(missed_track or track, video_id)
+
+    def track_skipped(self, track=None, video_id=None):
+        self._searched(track)
+
+    def track_search_failed(self, track):
+        self._searched(track)
+
+    def track_inserted(self, video_id=None):
+        self.inserted += 1
+        if video_id in self.searched:
+            self.timings.add('insert', time.perf_counter() - self.searched[video_id])
+
+    def track_failed(self, video_id, error):
+        pass
+
+    def set_stage(self, stage, tracks_total=None):
+        pass
+
+    def add_quota(self, units):
+        self.quota_units += units
+
+    def checkpoint(self):
+        pass
+
+
+def spotify_client(tracks, args, timings):
+    playlist_id = secrets.token_hex(11)
+    stub = SpotifyStub({playlist_id: ('Bench playlist', tracks)}, args.spotify_latency, timings)
+    return spotipy.Spotify(auth='bench', requests_session=spotify_session(stub)), playlist_id
+
+
+def bench_spotify(size, args, timings):
+    """Read a whole playlist from Spotify"""
+    tracks = synthetic_tracks(secrets.token_hex(4), size)
+    sp, playlist_id = spotify_client(tracks, args, timings)
+    tracks, _ = get_playlist_tracks_oauth(sp, playlist_id)
+    return len(tracks), 0
+
+
+def bench_search(size, args, timings):
+    """Match a playlist's tracks on YouTube Music"""
+    tracks = [Track.from_spotify(t) for t in synthetic_tracks(secrets.token_hex(4), size)]
+    recorder = Recorder(timings)
+    ytmusic = FakeYTMusic(args.search_latency, args.miss_rate, timings, args.search_stall_rate, args.search_stall)
+    get_video_ids(ytmusic, recorder.feed(tracks), progress=recorder)
+    return size, recorder.quota_units
+
+
+def bench_transfer(size, args, timings):
+    """Full transfer: Spotify paging, search and batched inserts into a new playlist"""
+    tracks = synthetic_tracks(secrets.token_hex(4), size)
+    sp, playlist_id = spotify_client(tracks, args, timings)
+    recorder = Recorder(timings)
+    stub = YouTubeStub(args.youtube_latency, timings)
+    youtube = build_from_document(
+        _get_youtube_document(), http=stub, requestBuilder=metered_request_builder(recorder)
+    )
+    # A fresh token per run gives every run its own empty playlist index
+    credentials = {'token': secrets.token_hex(8), 'client_id': 'bench', 'client_secret': 'bench'}
+    create_ytm_playlist_oauth(
+        credentials, recorder.feed(iter_playlist_tracks(sp, playlist_id)), 'Bench playlist',
+        progress=recorder, youtube=youtube,
+        ytmusic=FakeYTMusic(args.search_latency, args.miss_rate, timings, args.search_stall_rate, args.search_stall)
+    )
+    # Read the playlist back, which also exercises the playlistItems listing projection
+    index = get_playlist_index(credentials)
+    playlist_id = index.find_playlist(youtube, 'Bench playlist')
+    index.invalidate(playlist_id)
+    _, item_count = index.playlist_contents(youtube, playlist_id)
+    # The backend tolerates failed lookups and inserts, so refusals would otherwise go unnoticed
+    if stub.refused:
+        raise AssertionError(f"YouTube calls without a fields projection: {sorted(set(stub.refused))}")
+    if item_count != recorder.inserted:
+        raise AssertionError(f"Playlist has {item_count} items, {recorder.inserted} were inserted")
+    return size, recorder.quota_units
+
+
+BENCHMARKS = {
+    'spotify': (bench_spotify, ['spotify_request']),
+    'search': (bench_search, ['search_request', 'search']),
+    'transfer': (bench_transfer, ['spotify_request', 'search', 'insert', 'youtube_request']),
+}
+
+
+def run(name, size, args):
+    fn, stages = BENCHMARKS[name]
+    timings = Timings()
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        tracks, quota_units = fn(size, args, timings)
+        elapsed = time.perf_counter() - started
+        peak = None
+        if args.memory:
+            # Separate run: tracemalloc slows everything down, so it would skew the timings
+            tracemalloc.start()
+            fn(size, args, Timings())
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    result = {
+        'benchmark': name,
+        'tracks': size,
+        'seconds': round(elapsed, 3),
+        'tracks_per_sec': round(tracks / elapsed, 1) if elapsed else None,
+        'peak_mem_mb': round(peak / 2 ** 20, 2) if peak is not None else None,
+        'quota_units': quota_units,
+        'stages_ms': {}
+    }
+    for stage in stages:
+        p50, p99 = timings.percentiles(stage)
+        result['stages_ms'][stage] = {'p50': p50, 'p99': p99}
+    return result
+
+
+def print_row(r):
+    stages = '  '.join(f"{name} {s['p50']}/{s['p99']}" for name, s in r['stages_ms'].items())
+    peak = r['peak_mem_mb'] if r['peak_mem_mb'] is not None else '-'
+    print(f"{r['benchmark']:<10} {r['tracks']:>7} {r['seconds']:>9} {r['tracks_per_sec']:>9} {peak:>8}  {stages}",
+          flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline transfer benchmarks')
+    parser.add_argument('--sizes', default='100,1000,10000', help='Comma-separated playlist sizes')
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS), help='Comma-separated benchmarks to run')
+    parser.add_argument('--spotify-latency', type=float, default=0.02, help='Seconds per Spotify request')
+    parser.add_argument('--search-latency', type=float, default=0.05, help='Seconds per YouTube Music search')
+    parser.add_argument('--youtube-latency', type=float, default=0.05, help='Seconds per YouTube Data API request')
+    parser.add_argument('--miss-rate', type=float, default=0.05, help='Share of searches that find nothing')
+    parser.add_argument('--search-stall-rate', type=float, default=0.0, help='Share of searches that stall')
+    parser.add_argument('--search-stall', type=float, default=2.0, help='Seconds a stalled search takes')
+    parser.add_argument('--youtube-qps', type=float, help='Override the YouTube request rate limit')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='Skip the peak memory runs')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    if args.youtube_qps:
+        youtube_quota.max_qps = youtube_quota.rate = youtube_quota.tokens = args.youtube_qps
+
+    print(f"{'benchmark':<10} {'tracks':>7} {'seconds':>9} {'tracks/s':>9} {'peak MB':>8}  stage p50/p99 (ms)")
+    results = []
+    for name in args.benchmarks.split(','):
+        for size in (int(s) for s in args.sizes.split(',')):
+            results.append(run(name, size, args))
+            print_row(results[-1])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
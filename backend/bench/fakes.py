@@ -0,0 +1,250 @@
+import hashlib
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.parse
+from email.parser import FeedParser
+import httplib2
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Timings:
+    """Thread-safe collection of named durations (seconds)"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def percentiles(self, name):
+        """Return (p50, p99) in milliseconds, or (None, None) without samples"""
+        with self._lock:
+            values = sorted(self.samples.get(name, []))
+        if not values:
+            return None, None
+        pick = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1000
+        return round(pick(0.50), 2), round(pick(0.99), 2)
+
+
+def synthetic_tracks(run_id, count):
+    """Spotify track objects for a synthetic playlist; names are unique per run"""
+    return [
+        {
+            'id': f"{run_id}{i:07d}",
+            'name': f"Song {run_id} {i}",
+            'artists': [{'name': f"Artist {i % 997}"}],
+            'album': {'name': f"Album {i % 211}"},
+            'external_ids': {'isrc': f"QZBENCH{i:05d}"},
+            'duration_ms': 180000 + i % 120000,
+            'is_local': False,
+        }
+        for i in range(count)
+    ]
+
+
+class SpotifyStub(HTTPAdapter):
+    """
+    requests transport serving the Spotify Web API endpoints the backend uses.
+
+    Mount it on a session and pass that session to spotipy.Spotify. Calls to
+    endpoints that take a fields parameter are refused without one, so a
+    benchmark run fails if a partial-response projection is dropped.
+    """
+
+    def __init__(self, playlists, latency=0.0, timings=None):
+        super().__init__()
+        self.playlists = playlists  # id -> (name, [track objects])
+        self.latency = latency
+        self.timings = timings
+
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        time.sleep(self.latency)
+        url = urllib.parse.urlparse(request.url)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        parts = url.path.strip('/').split('/')[1:]  # drop the 'v1' prefix
+        limit = int(query.get('limit', 100))
+        offset = int(query.get('offset', 0))
+
+        if parts[0] == 'playlists' and 'fields' not in query:
+            return self._response(request, 400, {'error': {'status': 400, 'message': 'Bench: fields required'}})
+
+        if parts[:2] == ['me', 'playlists']:
+            items = [
+                {'id': pid, 'name': name, 'description': '', 'tracks': {'total': len(tracks)},
+                 'images': [], 'owner': {'display_name': 'bench'}, 'public': False,
+                 'snapshot_id': f"snap-{pid}"}
+                for pid, (name, tracks) in self.playlists.items()
+            ]
+            body = self._page(items, limit, offset)
+        elif parts[0] == 'playlists' and len(parts) == 2:
+            name, tracks = self.playlists[parts[1]]
+            body = {'id': parts[1], 'name': name, 'snapshot_id': f"snap-{parts[1]}",
+                    'tracks': {'total': len(tracks)}}
+        elif parts[0] == 'playlists' and parts[2] == 'tracks':
+            _, tracks = self.playlists[parts[1]]
+            body = self._page([{'track': track} for track in tracks], limit, offset)
+        else:
+            return self._response(request, 404, {'error': {'status': 404, 'message': 'Not found'}})
+
+        if self.timings:
+            self.timings.add('spotify_request', time.perf_counter() - started)
+        return self._response(request, 200, body)
+
+    @staticmethod
+    def _page(items, limit, offset):
+        return {'items': items[offset:offset + limit], 'total': len(items),
+                'limit': limit, 'offset': offset, 'next': None}
+
+    @staticmethod
+    def _response(request, status, body):
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode()
+        response.headers['Content-Type'] = 'application/json'
+        response.url = request.url
+        response.request = request
+        response.encoding = 'utf-8'
+        return response
+
+
+def spotify_session(stub):
+    session = requests.Session()
+    session.mount('https://api.spotify.com/', stub)
+    return session
+
+
+class FakeYTMusic:
+    """
+    Stand-in for ytmusicapi.YTMusic.search; a fixed share of queries find
+    nothing, and a random share of calls stall for `stall` seconds first
+    """
+
+    def __init__(self, latency=0.0, miss_rate=0.05, timings=None, stall_rate=0.0, stall=0.0):
+        self.latency = latency
+        self.miss_rate = miss_rate
+        self.timings = timings
+        self.stall_rate = stall_rate
+        self.stall = stall
+
+    def search(self, query, filter=None, **kwargs):
+        started = time.perf_counter()
+        time.sleep(self.stall if random.random() < self.stall_rate else self.latency)
+        digest = hashlib.md5(query.encode()).hexdigest()
+        if int(digest[:8], 16) / 0xFFFFFFFF < self.miss_rate:
+            results = []
+        else:
+            results = [{'videoId': digest[:11], 'title': query, 'resultType': 'song'}]
+        if self.timings:
+            self.timings.add('search_request', time.perf_counter() - started)
+        return results
+
+
+class YouTubeStub:
+    """
+    httplib2-style transport serving the YouTube Data API v3 playlist endpoints,
+    including batch requests. Pass it as http= to googleapiclient's build_from_document.
+
+    Like SpotifyStub, it refuses calls that would fetch whole resources: every
+    call but a delete needs a fields parameter, and item listings only carry
+    the parts requested.
+    """
+
+    def __init__(self, latency=0.0, timings=None):
+        self.latency = latency
+        self.timings = timings
+        self.playlists = {}  # id -> {'title', 'items': [(item_id, video_id)]}
+        self.calls = []
+        self.refused = []  # calls refused for lacking a fields projection
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        started = time.perf_counter()
+        time.sleep(self.latency)
+        url = urllib.parse.urlparse(uri)
+        if url.path.strip('/').split('/')[0] == 'batch':
+            result = self._batch(body, headers)
+        else:
+            status, payload = self._handle(method, url.path, url.query, body)
+            result = (httplib2.Response({'status': str(status), 'content-type': 'application/json'}),
+                      json.dumps(payload).encode())
+        if self.timings:
+            self.timings.add('youtube_request', time.perf_counter() - started)
+        return result
+
+    def _handle(self, method, path, query, body):
+        params = dict(urllib.parse.parse_qsl(query))
+        resource = path.rsplit('/', 1)[-1]
+        data = json.loads(body) if body else {}
+        with self._lock:
+            self.calls.append(f"{resource}.{method}")
+            if method != 'DELETE' and 'fields' not in params:
+                self.refused.append(f"{resource}.{method}")
+                return 400, {'error': {'code': 400, 'message': 'Bench: fields required',
+                                       'errors': [{'reason': 'badRequest'}]}}
+            if resource == 'playlists' and method == 'GET':
+                items = [{'id': pid, 'snippet': {'title': pl['title']}} for pid, pl in self.playlists.items()]
+                return 200, self._page(items, params)
+            if resource == 'playlists' and method == 'POST':
+                playlist_id = f"PL{next(self._ids)}"
+                self.playlists[playlist_id] = {'title': data['snippet']['title'], 'items': []}
+                return 200, {'id': playlist_id, 'snippet': data['snippet']}
+            if resource == 'playlistItems' and method == 'GET':
+                parts = params['part'].split(',')
+                items = [
+                    {'id': item_id,
+                     **({'snippet': {'resourceId': {'videoId': video_id}}} if 'snippet' in parts else {}),
+                     **({'contentDetails': {'videoId': video_id}} if 'contentDetails' in parts else {})}
+                    for item_id, video_id in self.playlists[params['playlistId']]['items']
+                ]
+                return 200, self._page(items, params)
+            if resource == 'playlistItems' and method == 'POST':
+                snippet = data['snippet']
+                items = self.playlists[snippet['playlistId']]['items']
+                item = (f"item{next(self._ids)}", snippet['resourceId']['videoId'])
+                items.insert(snippet.get('position', len(items)), item)
+                return 200, {'id': item[0], 'snippet': snippet}
+            if resource == 'playlistItems' and method == 'DELETE':
+                for playlist in self.playlists.values():
+                    playlist['items'] = [item for item in playlist['items'] if item[0] != params['id']]
+                return 204, {}
+        return 404, {'error': {'code': 404, 'message': 'Not found', 'errors': [{'reason': 'notFound'}]}}
+
+    @staticmethod
+    def _page(items, params):
+        size = int(params.get('maxResults', 5))
+        start = int(params.get('pageToken', 0))
+        page = {'etag': f"etag-{len(items)}", 'pageInfo': {'totalResults': len(items)},
+                'items': items[start:start + size]}
+        if start + size < len(items):
+            page['nextPageToken'] = str(start + size)
+        return page
+
+    def _batch(self, body, headers):
+        parser = FeedParser()
+        parser.feed(f"content-type: {headers['content-type']}\r\n\r\n{body}")
+        parts = []
+        for part in parser.close().get_payload():
+            request_line, rest = part.get_payload().split('\n', 1)
+            method, target, _ = request_line.split(' ', 2)
+            sub = FeedParser()
+            sub.feed(rest)
+            url = urllib.parse.urlparse(target)
+            status, payload = self._handle(method, url.path, url.query, sub.close().get_payload() or None)
+            parts.append(
+                f"Content-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'][1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        boundary = 'batch_bench'
+        content = ''.join(f"--{boundary}\r\n{part}" for part in parts) + f"--{boundary}--\r\n"
+        response = httplib2.Response({'status': '200', 'content-type': f'multipart/mixed; boundary={boundary}'})
+        return response, content.encode()
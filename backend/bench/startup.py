@@ -0,0 +1,113 @@
+"""
+Worker cold start profile.
+
+Run from the backend directory:
+
+    python -m bench.startup --repeat 5
+
+Each run starts a fresh interpreter that imports the app the way a gunicorn
+worker does, answers the health check, then runs the background warm-up.
+Reports import time, time to the first health check response and resident
+memory before and after warm-up, plus the slowest imports by package.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+# Runs in the child interpreter; prints one JSON line
+PROBE = '''
+import json, resource, sys, time
+def rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+status = main.app.test_client().get('/').status_code
+answered = time.perf_counter()
+rss_ready = rss_mb()
+sys.stderr.write('ready\\n')  # imports after this line are the warm-up's
+from clients import warm_up
+warm_up()
+warmed = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (answered - started) * 1000,
+    'warm_up_ms': (warmed - answered) * 1000,
+    'rss_ready_mb': rss_ready,
+    'rss_warm_mb': rss_mb(),
+    'health_status': status
+}))
+'''
+
+
+def probe(env):
+    """Run one cold start in a child interpreter; returns (measurements, importtime lines up to ready)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    lines = result.stderr.splitlines()
+    return json.loads(result.stdout.strip().splitlines()[-1]), lines[:lines.index('ready')]
+
+
+def slowest_packages(importtime_lines, top):
+    """Sum -X importtime self times by top-level package, slowest first (ms)"""
+    totals = {}
+    for line in importtime_lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0) + int(self_us) / 1000
+    return sorted(((name, round(ms, 1)) for name, ms in totals.items()), key=lambda p: p[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Worker cold start profile')
+    parser.add_argument('--repeat', type=int, default=5, help='Cold starts to measure (medians are reported)')
+    parser.add_argument('--top', type=int, default=10, help='Slowest packages to list')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    # The children inherit the bench package's settings, so nothing touches the real data directory
+    env = dict(os.environ)
+
+    runs = []
+    importtime = None
+    for _ in range(args.repeat):
+        measurements, lines = probe(env)
+        runs.append(measurements)
+        importtime = importtime or lines
+
+    result = {key: round(statistics.median(run[key] for run in runs), 1) for key in runs[0] if key != 'health_status'}
+    result['slowest_packages_ms'] = slowest_packages(importtime, args.top)
+
+    print(f"import main            {result['import_ms']:>8} ms")
+    print(f"first health check     {result['first_request_ms']:>8} ms")
+    print(f"background warm-up     {result['warm_up_ms']:>8} ms")
+    print(f"RSS when ready         {result['rss_ready_mb']:>8} MB")
+    print(f"RSS after warm-up      {result['rss_warm_mb']:>8} MB")
+    print('slowest packages to import before the health check (self time, first run):')
+    for name, ms in result['slowest_packages_ms']:
+        print(f"  {name:<22} {ms:>8} ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
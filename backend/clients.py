@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+from pathlib import Path
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+# Load .env from root directory (parent of backend)
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# Keep-alive connections kept open per upstream host
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '32'))
+# Socket timeout (seconds) for pooled requests made without one; ytmusicapi never sets one
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '30'))
+
+# ytmusicapi, googleapiclient, spotipy and the Google auth libraries take a
+# large share of startup time, so they are imported on first use (or by
+# warm_up once a worker is serving) rather than when the app loads.
+
+# Resources whose methods we call; warmed once so later builds don't change the shared document
+YOUTUBE_RESOURCES = ('channels', 'playlists', 'playlistItems')
+
+_lock = threading.Lock()
+_http_session = None
+_spotify_session = None
+_ytmusic = None
+_youtube_document = None
+
+
+class _TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that gives requests made without a timeout HTTP_TIMEOUT, so a stalled call can't hang forever"""
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=timeout or HTTP_TIMEOUT, **kwargs)
+
+
+def get_http_session():
+    """Return the process-wide pooled keep-alive requests session"""
+    global _http_session
+    with _lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = _TimeoutHTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _http_session = session
+        return _http_session
+
+
+def get_spotify_session():
+    """
+    Return the process-wide pooled session for the Spotify Web API.
+
+    Spotipy only installs its retry policy on sessions it builds itself, so
+    the same policy (retry 429 and 5xx, honouring Retry-After) is mounted here.
+    """
+    global _spotify_session
+    with _lock:
+        if _spotify_session is None:
+            session = requests.Session()
+            retry = urllib3.Retry(
+                total=3,
+                connect=None,
+                read=False,
+                allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+                status=3,
+                backoff_factor=0.3,
+                status_forcelist=(429, 500, 502, 503, 504)
+            )
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _spotify_session = session
+        return _spotify_session
+
+
+def get_ytmusic():
+    """
+    Return the process-wide unauthenticated YTMusic instance used for search.
+
+    Searching only reads instance state, so one instance is shared by every
+    search thread; its requests go through the pooled session.
+    """
+    global _ytmusic
+    session = get_http_session()
+    with _lock:
+        if _ytmusic is None:
+            from ytmusicapi import YTMusic
+            _ytmusic = YTMusic(requests_session=session)
+        return _ytmusic
+
+
+def _get_youtube_document():
+    global _youtube_document
+    with _lock:
+        if _youtube_document is None:
+            from googleapiclient.discovery import build_from_document
+            from googleapiclient.discovery_cache import get_static_doc
+            from googleapiclient.http import build_http
+            # The discovery document bundled with google-api-python-client: no network fetch
+            document = json.loads(get_static_doc('youtube', 'v3'))
+            # build_from_document fixes up method descriptions in place the first
+            # time each resource is created; do that once here, under the lock
+            service = build_from_document(document, http=build_http())
+            for resource in YOUTUBE_RESOURCES:
+                getattr(service, resource)()
+            _youtube_document = document
+        return _youtube_document
+
+
+def build_youtube_service(credentials, request_builder=None):
+    """Build a YouTube Data API v3 client for one user's google.oauth2 Credentials"""
+    from googleapiclient.discovery import build_from_document
+    kwargs = {'requestBuilder': request_builder} if request_builder else {}
+    return build_from_document(_get_youtube_document(), credentials=credentials, **kwargs)
+
+
+def warm_up():
+    """
+    Load the heavy upstream libraries and build the shared clients before
+    the first transfer needs them. Meant for a background thread in a
+    worker that is already serving requests.
+    """
+    import spotipy  # noqa: F401
+    import google_auth_oauthlib.flow  # noqa: F401
+    import google.oauth2.credentials  # noqa: F401
+    _get_youtube_document()
+    get_ytmusic()
@@ -3,13 +3,18 @@ import os
 
 # Server socket
 bind = "0.0.0.0:8080"
-workers = 1  # Use single worker to avoid session issues with in-memory state
-worker_class = 'sync'
+# Sessions, OAuth states and job records live in the shared state store
+# (STATE_BACKEND in state_store.py), so any worker can serve any request.
+# The YouTube quota ledger lives there too and is shared by every worker.
+workers = int(os.getenv('GUNICORN_WORKERS', min(4, multiprocessing.cpu_count() * 2 + 1)))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
 timeout = 900
 
 # Worker settings
-max_requests = 1000
-max_requests_jitter = 50
+# Transfers run on threads inside the worker (jobs.py), and a worker recycled
+# after max_requests can't exit until they end, so workers are never recycled
+max_requests = 0
 keepalive = 500 
 
 # Logging - suppress debug logs
@@ -36,4 +41,13 @@ def when_ready(server):
     sys.stderr.write(f"🌐 Visit: {frontend_url}\n")
     sys.stderr.write(f"📝 Transfer your playlists now!\n")
     sys.stderr.write("="*60 + "\n\n")
-    sys.stderr.flush()
\ No newline at end of file
+    sys.stderr.flush()
+
+
+# Heavy upstream libraries (ytmusicapi, googleapiclient, spotipy) are not
+# imported with the app, so workers answer the health check straight away;
+# each worker then loads them in the background before the first transfer
+def post_worker_init(worker):
+    import threading
+    from clients import warm_up
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
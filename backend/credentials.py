@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from dotenv import load_dotenv
+from singleflight import SingleFlight
+from state_store import get_state_store
+from metrics import TOKEN_REFRESHES
+
+# Load .env from root directory (parent of backend)
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# Tokens expiring within this many seconds are refreshed in the background
+TOKEN_REFRESH_MARGIN = float(os.getenv('TOKEN_REFRESH_MARGIN', '600'))
+# Tokens this close to expiry (or past it) are refreshed before they are used
+TOKEN_EXPIRY_SLACK = 60
+# Refreshed tokens are kept for as long as a refresh token is plausibly still valid
+CREDENTIALS_TTL = 30 * 24 * 3600
+# A worker's claim on a background refresh lapses after this many seconds
+REFRESH_CLAIM_TTL = 30
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _submit(fn, *args):
+    # Created on first use so the gunicorn master never starts the threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='token-refresh')
+    _executor.submit(fn, *args)
+
+
+class CredentialManager:
+    """
+    Keeps users' OAuth tokens refreshed ahead of expiry.
+
+    The newest tokens of each user are kept in the shared state store, keyed
+    by a hash of their refresh token, so a refresh done by any worker or
+    background job is seen by every later request. A token entering the last
+    TOKEN_REFRESH_MARGIN seconds of its life is refreshed in the background
+    while the caller keeps using it; only an expired token makes the caller
+    wait. Concurrent refreshes of one user's token are coalesced into one
+    OAuth round trip per process, and workers claim background refreshes in
+    the store so only one of them makes it.
+    """
+
+    def __init__(self, service, refresh, expires_at, refresh_token):
+        self.service = service
+        self._refresh = refresh  # credentials dict -> refreshed credentials dict
+        self._expires_at = expires_at  # credentials dict -> epoch seconds, or None if unknown
+        self._refresh_token = refresh_token  # credentials dict -> refresh token, or None
+        self._flight = SingleFlight()
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _key(self, credentials):
+        token = self._refresh_token(credentials)
+        if not token:
+            return None
+        return f'credentials:{self.service}:{hashlib.sha256(token.encode()).hexdigest()}'
+
+    def _remaining(self, credentials):
+        expires_at = self._expires_at(credentials)
+        return None if expires_at is None else expires_at - time.time()
+
+    def _stored(self, key):
+        data = get_state_store().get(key)
+        return json.loads(data) if data else None
+
+    def save(self, credentials, key=None):
+        """Store credentials as the user's newest tokens"""
+        key = key or self._key(credentials)
+        if key:
+            get_state_store().set(key, json.dumps(credentials), CREDENTIALS_TTL)
+
+    def current(self, credentials):
+        """
+        Return the freshest credentials for the user owning these.
+
+        Fresh credentials are returned as they are without touching the store,
+        so this is cheap enough to call before every use. The result is a new
+        dict whenever the tokens changed, so callers can tell when to write
+        them back.
+        """
+        remaining = self._remaining(credentials)
+        if remaining is not None and remaining > TOKEN_REFRESH_MARGIN:
+            return credentials
+        key = self._key(credentials)
+        if key is None:
+            return credentials  # Nothing to refresh with
+
+        stored = self._stored(key)
+        if stored and (self._expires_at(stored) or 0) > (self._expires_at(credentials) or 0):
+            credentials = stored
+            remaining = self._remaining(credentials)
+            if remaining > TOKEN_REFRESH_MARGIN:
+                return credentials
+
+        if remaining is not None and remaining <= TOKEN_EXPIRY_SLACK:
+            return self._flight.do(key, lambda: self._refresh_now(key, credentials, 'blocking'))
+        self._schedule(key, credentials)
+        return credentials
+
+    def _refresh_now(self, key, credentials, mode):
+        # Another worker may have refreshed since the caller looked
+        stored = self._stored(key)
+        if stored and (self._remaining(stored) or 0) > TOKEN_REFRESH_MARGIN:
+            return stored
+        refreshed = self._refresh(credentials)
+        TOKEN_REFRESHES.inc(self.service, mode)
+        self.save(refreshed, key)
+        if self._key(refreshed) != key:
+            self.save(refreshed)  # The refresh token was rotated
+        return refreshed
+
+    def _schedule(self, key, credentials):
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        store = get_state_store()
+        if not store.add(f'{key}:refreshing', str(os.getpid()), REFRESH_CLAIM_TTL):
+            # Another worker is refreshing; its result will be in the store
+            with self._lock:
+                self._pending.discard(key)
+            return
+        _submit(self._background_refresh, key, credentials)
+
+    def _background_refresh(self, key, credentials):
+        try:
+            self._flight.do(key, lambda: self._refresh_now(key, credentials, 'background'))
+        except Exception:
+            TOKEN_REFRESHES.inc(self.service, 'failed')
+            traceback.print_exc()
+        finally:
+            get_state_store().delete(f'{key}:refreshing')
+            with self._lock:
+                self._pending.discard(key)
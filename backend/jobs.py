@@ -0,0 +1,509 @@
+import json
+import os
+import secrets
+import threading
+from collections import deque
+import time
+import traceback
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from quota import QuotaExhausted
+from state_store import get_state_store
+from metrics import TRACKS, TRANSFERS_IN_FLIGHT
+from tracing import Trace, NO_TRACE
+
+# Load .env from root directory (parent of backend)
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# Transfers run on their own pool so they never hold a web worker
+TRANSFER_WORKERS = int(os.getenv('TRANSFER_WORKERS', '4'))
+# How long finished jobs stay available for polling (seconds); a job waiting
+# for the quota to reset is kept this long past its resume_after
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', '3600'))
+# How often a running job's record is re-saved, and when a silent one counts as interrupted (seconds)
+JOB_SYNC_INTERVAL = float(os.getenv('JOB_SYNC_INTERVAL', '2'))
+JOB_HEARTBEAT_TIMEOUT = int(os.getenv('JOB_HEARTBEAT_TIMEOUT', '120'))
+# Per-track events kept per job for progress streams to replay from a cursor
+JOB_EVENT_BUFFER = int(os.getenv('JOB_EVENT_BUFFER', '500'))
+# How often a progress stream sends a snapshot with rate and ETA (seconds)
+JOB_PROGRESS_INTERVAL = 1.0
+# Names of missed tracks are stored apart from the job record, this many per entry
+MISSED_CHUNK_SIZE = 500
+
+# Statuses a job can be resumed from
+RESUMABLE_STATUSES = {'failed', 'quota_exhausted', 'interrupted'}
+
+_executor = ThreadPoolExecutor(max_workers=TRANSFER_WORKERS, thread_name_prefix='transfer')
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class TransferJob:
+    """Progress record for a background transfer, updated by the transfer as it runs"""
+
+    def __init__(self, playlist_id, resume=None, job_id=None):
+        self.id = job_id or secrets.token_urlsafe(16)
+        self.playlist_id = playlist_id
+        # JSON-able description of the job that the caller needs to resume it
+        self.resume = resume
+        # queued -> running -> completed | failed | quota_exhausted
+        # (interrupted if the process stopped while it was running)
+        self.status = 'queued'
+        self.stage = 'queued'
+        self.tracks_total = 0
+        self.tracks_searched = 0
+        self.tracks_inserted = 0
+        self.tracks_failed = 0
+        self.tracks_search_failed = 0  # searches that kept failing, as opposed to finding nothing
+        self.quota_units = 0
+        self.resume_after = None
+        # Missed track names are written to the store in chunks as the job
+        # runs; only those not yet written are held here
+        self.missed_count = 0
+        self.missed_pending = []
+        self._missed_saved = 0
+        self._missed_written = {}  # chunk number -> when it was last written
+        self.playlists = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.heartbeat = None  # when a job loaded from the store was last saved
+        self.attempt = 0  # bumped each time the job is resumed
+        # Recent events, numbered by event_seq; sequence numbers never repeat for a job
+        self.events = deque(maxlen=JOB_EVENT_BUFFER)
+        self.event_seq = 0
+        # Span trace of the running attempt (see tracing.py)
+        self.trace = NO_TRACE
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def _event(self, event_type, **fields):
+        # Caller holds self._lock
+        self.event_seq += 1
+        self.events.append({'seq': self.event_seq, 'type': event_type, 'time': time.time(), **fields})
+        self._changed.notify_all()
+
+    def set_stage(self, stage, tracks_total=None):
+        """Move the job to a new stage, optionally recording the number of tracks"""
+        with self._lock:
+            self.stage = stage
+            if tracks_total is not None:
+                self.tracks_total = tracks_total
+            self._event('stage', stage=stage, tracks_total=self.tracks_total)
+
+    def set_status(self, status):
+        with self._lock:
+            self.status = status
+            if status == 'running':
+                self.started_at = time.time()
+            self._event('status', status=status)
+
+    def track_searched(self, missed_track=None, track=None, video_id=None):
+        """Record one searched track: missed_track names a track that was not found"""
+        with self._lock:
+            self.tracks_searched += 1
+            if missed_track:
+                TRACKS.inc('missed')
+                self.missed_count += 1
+                self.missed_pending.append(missed_track)
+                self._event('missed', track=missed_track)
+            else:
+                self._event('matched', track=track, video_id=video_id)
+
+    def track_search_failed(self, track):
+        """Record a track whose search kept failing; it is not missed, and the next sync searches it again"""
+        with self._lock:
+            self.tracks_searched += 1
+            self.tracks_search_failed += 1
+            TRACKS.inc('search_failed')
+            self._event('search_failed', track=track)
+    
+    def track_skipped(self, track=None, video_id=None):
+        """Record a track that was already transferred by an earlier sync"""
+        with self._lock:
+            self.tracks_searched += 1
+            TRACKS.inc('skipped')
+            self._event('skipped', track=track, video_id=video_id)
+
+    def track_inserted(self, video_id=None):
+        """Record one song added to the YouTube playlist"""
+        with self._lock:
+            self.tracks_inserted += 1
+            TRACKS.inc('transferred')
+            self._event('inserted', video_id=video_id)
+
+    def track_failed(self, video_id, error):
+        """Record a found song that could not be added to the playlist"""
+        with self._lock:
+            self.tracks_failed += 1
+            TRACKS.inc('failed')
+            self._event('failed', video_id=video_id, error=str(error))
+
+    def events_since(self, cursor):
+        """Return buffered events with a sequence number after cursor"""
+        with self._lock:
+            return [event for event in self.events if event['seq'] > cursor]
+
+    def wait(self, cursor, timeout):
+        """Wait up to timeout seconds for an event after cursor"""
+        with self._changed:
+            if self.event_seq <= cursor and not self.finished_at:
+                self._changed.wait(timeout)
+
+    def progress(self):
+        """Counters plus search rate (tracks/second) and estimated seconds left"""
+        with self._lock:
+            return self._progress()
+
+    def _progress(self):
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0
+        rate = self.tracks_searched / elapsed if elapsed > 0 else 0.0
+        remaining = self.tracks_total - self.tracks_searched
+        eta = round(remaining / rate) if rate and remaining > 0 and not self.finished_at else None
+        return {
+            'status': self.status,
+            'stage': self.stage,
+            'tracks_total': self.tracks_total,
+            'tracks_searched': self.tracks_searched,
+            'tracks_inserted': self.tracks_inserted,
+            'tracks_failed': self.tracks_failed,
+            'tracks_search_failed': self.tracks_search_failed,
+            'quota_units': self.quota_units,
+            'rate': round(rate, 2),
+            'eta_seconds': eta
+        }
+
+    def add_quota(self, units):
+        """Charge YouTube Data API units to this job"""
+        with self._lock:
+            self.quota_units += units
+
+    def playlist_finished(self, summary):
+        """Record the outcome of one playlist in a multi-playlist job"""
+        with self._lock:
+            self.playlists.append(summary)
+
+    def reset(self):
+        """Clear progress before the job is run again"""
+        with self._lock:
+            self.attempt += 1
+            self.status = 'queued'
+            self.stage = 'queued'
+            self.tracks_total = 0
+            self.tracks_searched = 0
+            self.tracks_inserted = 0
+            self.tracks_failed = 0
+            self.tracks_search_failed = 0
+            self.resume_after = None
+            self.missed_count = 0
+            self.missed_pending = []
+            self._missed_saved = 0
+            self.playlists = []
+            self.result = None
+            self.error = None
+            self.started_at = None
+            self.finished_at = None
+            self._event('status', status='queued')
+
+    def checkpoint(self):
+        """Persist the job's current progress"""
+        _store.save(self)
+
+    @classmethod
+    def from_record(cls, record):
+        """Rebuild a job from a stored to_dict() record"""
+        job = cls(record['playlist_id'], resume=record.get('resume'), job_id=record['job_id'])
+        job.status = record['status']
+        job.stage = record['stage']
+        job.tracks_total = record['tracks_total']
+        job.tracks_searched = record['tracks_searched']
+        job.tracks_inserted = record['tracks_inserted']
+        job.tracks_failed = record.get('tracks_failed', 0)
+        job.tracks_search_failed = record.get('tracks_search_failed', 0)
+        job.quota_units = record['quota_units']
+        job.resume_after = record['resume_after']
+        job.missed_count = job._missed_saved = record['missed_tracks']['count']
+        job.playlists = record['playlists']
+        job.result = record['result']
+        job.error = record['error']
+        job.created_at = record.get('created_at', job.created_at)
+        job.started_at = record.get('started_at')
+        job.finished_at = record.get('finished_at')
+        job.events.extend(record.get('events', []))
+        job.event_seq = record.get('event_seq', 0)
+        job.heartbeat = record.get('heartbeat')
+        job.attempt = record.get('attempt', 0)
+        return job
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'playlist_id': self.playlist_id,
+                **self._progress(),
+                'resume_after': self.resume_after,
+                # The names are paged from /transfer/jobs/<id>/missed
+                'missed_tracks': {'count': self.missed_count},
+                'playlists': list(self.playlists),
+                'result': self.result,
+                'error': self.error,
+                'resumable': self.status in RESUMABLE_STATUSES and self.resume is not None
+            }
+
+
+class JobStore:
+    """
+    Job records in the shared state store, so any worker can report or resume a job.
+
+    The process running a job re-saves it every JOB_SYNC_INTERVAL seconds; a
+    queued or running record whose heartbeat is older than JOB_HEARTBEAT_TIMEOUT
+    belonged to a process that stopped, and is reported as interrupted.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or get_state_store()
+        self._lock = threading.Lock()
+
+    def save(self, job):
+        with self._lock:
+            self._save_missed(job)
+            self._save_record(job)
+
+    @staticmethod
+    def _retention(job):
+        # A quota-exhausted job must outlive the wait before it can be resumed
+        if job.resume_after and job.status in RESUMABLE_STATUSES:
+            return max(JOB_RETENTION, job.resume_after - time.time() + JOB_RETENTION)
+        return JOB_RETENTION
+
+    def _save_missed(self, job):
+        # Caller holds self._lock, so chunks are appended in order
+        with job._lock:
+            names, job.missed_pending = job.missed_pending, []
+            offset = job._missed_saved
+            job._missed_saved += len(names)
+        now = time.time()
+        ttl = self._retention(job)
+        while names:
+            chunk, start = divmod(offset, MISSED_CHUNK_SIZE)
+            take, names = names[:MISSED_CHUNK_SIZE - start], names[MISSED_CHUNK_SIZE - start:]
+            existing = self._missed_chunk(job.id, chunk)[:start] if start else []
+            self.store.set(f'job_missed:{job.id}:{chunk}', json.dumps(existing + take), ttl)
+            job._missed_written[chunk] = now
+            offset += len(take)
+        # Keep earlier chunks alive as long as the record: on the final save,
+        # and whenever one is halfway to expiring
+        for chunk, written in list(job._missed_written.items()):
+            if job.finished_at or now - written > JOB_RETENTION / 2:
+                data = self.store.get(f'job_missed:{job.id}:{chunk}')
+                if data:
+                    self.store.set(f'job_missed:{job.id}:{chunk}', data, ttl)
+                job._missed_written[chunk] = now
+
+    def _missed_chunk(self, job_id, chunk):
+        return json.loads(self.store.get(f'job_missed:{job_id}:{chunk}') or '[]')
+
+    def missed_tracks(self, job_id, offset, limit):
+        """Names of a job's missed tracks from offset, as of its last save"""
+        names = []
+        while len(names) < limit:
+            chunk, start = divmod(offset + len(names), MISSED_CHUNK_SIZE)
+            page = self._missed_chunk(job_id, chunk)[start:start + limit - len(names)]
+            if not page:
+                break
+            names.extend(page)
+        return names
+
+    def _save_record(self, job):
+        record = job.to_dict()
+        with job._lock:
+            events = list(job.events)
+        record.update(
+            resume=job.resume, attempt=job.attempt, created_at=job.created_at,
+            started_at=job.started_at, finished_at=job.finished_at, heartbeat=time.time(),
+            events=events, event_seq=job.event_seq
+        )
+        self.store.set(f'job:{job.id}', json.dumps(record), self._retention(job))
+
+    def load(self, job_id):
+        """Return the stored record for a job, or None"""
+        record = self.store.get(f'job:{job_id}')
+        if not record:
+            return None
+        record = json.loads(record)
+        if record['status'] in ('queued', 'running') and time.time() - record['heartbeat'] > JOB_HEARTBEAT_TIMEOUT:
+            record['status'] = 'interrupted'
+        return record
+
+    def claim(self, job_id, attempt):
+        """Claim the right to start the next attempt of a job; only one caller wins"""
+        return self.store.add(f'job_claim:{job_id}:{attempt}', str(os.getpid()), JOB_RETENTION)
+
+
+_store = JobStore()
+
+
+def _sync_jobs():
+    # Keep progress visible to other workers and prove this process is alive
+    while True:
+        time.sleep(JOB_SYNC_INTERVAL)
+        with _jobs_lock:
+            running = [job for job in _jobs.values() if not job.finished_at]
+        for job in running:
+            try:
+                job.trace.flush()
+                job.checkpoint()
+            except Exception:
+                traceback.print_exc()
+
+
+_sync_thread = None
+
+
+def _start_sync_thread():
+    # Started on first use rather than at import, so it runs in the worker, not the gunicorn master
+    global _sync_thread
+    with _jobs_lock:
+        if _sync_thread is None:
+            _sync_thread = threading.Thread(target=_sync_jobs, name='job-sync', daemon=True)
+            _sync_thread.start()
+
+
+def _run(job, fn, args):
+    job.set_status('running')
+    job.checkpoint()
+    TRANSFERS_IN_FLIGHT.inc()
+    job.trace = Trace(job.id, job.attempt)
+    status = 'failed'
+    try:
+        result = fn(job, *args)
+        with job._lock:
+            job.result = result
+            job.stage = 'done'
+        status = 'completed'
+    except QuotaExhausted as e:
+        # Matches are cached and existing songs are skipped, so re-running resumes the transfer
+        with job._lock:
+            job.error = str(e)
+            job.resume_after = e.resets_at
+        status = 'quota_exhausted'
+    except Exception as e:
+        traceback.print_exc()
+        with job._lock:
+            job.error = str(e)
+    finally:
+        TRANSFERS_IN_FLIGHT.dec()
+        job.trace.close(status=status, error=job.error)
+        with job._lock:
+            job.finished_at = time.time()
+        # The final status ends progress streams, and clients then page the
+        # missed tracks, so everything is saved before it is announced
+        job.checkpoint()
+        job.set_status(status)
+        job.checkpoint()
+
+
+def _expire_jobs():
+    cutoff = time.time() - JOB_RETENTION
+    with _jobs_lock:
+        for job_id in [jid for jid, job in _jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del _jobs[job_id]
+
+
+def submit_job(playlist_id, fn, *args, resume=None):
+    """
+    Run fn(job, *args) on the transfer executor.
+
+    fn must not touch the Flask request or session; everything it needs is
+    passed in args. Its return value becomes the job result. resume is stored
+    with the job (it must not hold credentials) and handed back to the caller
+    when the job is resumed.
+    """
+    _expire_jobs()
+    _start_sync_thread()
+    job = TransferJob(playlist_id, resume=resume)
+    with _jobs_lock:
+        _jobs[job.id] = job
+    job.checkpoint()
+    _executor.submit(_run, job, fn, args)
+    return job
+
+
+def resume_job(job, fn, *args):
+    """
+    Run a failed, quota-exhausted or interrupted job again under the same id.
+
+    Returns the job, or None if it is not in a resumable state (e.g. already resumed).
+    """
+    _start_sync_thread()
+    with _jobs_lock:
+        # Prefer our own copy unless the job has run again elsewhere since
+        local = _jobs.get(job.id)
+        if local is not None and local.attempt >= job.attempt:
+            job = local
+        if job.status not in RESUMABLE_STATUSES:
+            return None
+        if not _store.claim(job.id, job.attempt):
+            # Another worker resumed it first
+            return None
+        job.reset()
+        _jobs[job.id] = job
+    job.checkpoint()
+    _executor.submit(_run, job, fn, args)
+    return job
+
+
+def get_job(job_id):
+    """Return a job by id, or None if it is unknown or expired"""
+    _expire_jobs()
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None or job.finished_at:
+        # Started by another worker, or before this process did: rebuild it from the store.
+        # A job that finished here may since have been resumed by another worker
+        record = _store.load(job_id)
+        if record and (job is None or record.get('attempt', 0) > job.attempt):
+            job = TransferJob.from_record(record)
+    return job
+
+
+def get_missed_tracks(job, offset=0, limit=100):
+    """Page through the names of a job's missed tracks"""
+    return _store.missed_tracks(job.id, offset, limit)
+
+
+def watch_job(job_id, cursor=0, max_seconds=None):
+    """
+    Yield a job's events after cursor as they happen, a 'progress' snapshot
+    every JOB_PROGRESS_INTERVAL seconds and a final 'end' event with the full
+    job once it has finished. With max_seconds, stops after that long even
+    if the job is still running.
+
+    Nothing is kept per watcher besides the cursor, so a client that
+    reconnects with the last sequence number it saw picks up where it left off.
+    Works for jobs running in another worker too, from their stored record;
+    a job whose worker died is reported as interrupted and ends the stream.
+    """
+    last_progress = 0
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    while deadline is None or time.monotonic() < deadline:
+        job = get_job(job_id)
+        if job is None:
+            return
+        for event in job.events_since(cursor):
+            cursor = event['seq']
+            yield event
+        # An interrupted job is finished too, though its worker never set finished_at
+        if job.status not in ('queued', 'running') and cursor >= job.event_seq:
+            yield {'type': 'end', **job.to_dict()}
+            return
+        now = time.monotonic()
+        if now - last_progress >= JOB_PROGRESS_INTERVAL:
+            last_progress = now
+            yield {'type': 'progress', **job.progress()}
+        job.wait(cursor, JOB_PROGRESS_INTERVAL)
@@ -1,13 +1,26 @@
-from flask import Flask, request, redirect, session, jsonify
+from flask import Flask, Response, request, redirect, session, jsonify
 from flask_cors import CORS
-from ytm import create_ytm_playlist_oauth
-from spotify import get_user_playlists, get_playlist_tracks_oauth
+from ytm import build_youtube_client, get_channel_id, inflight_searches
+from clients import get_ytmusic
+from spotify import PLAYLIST_FIELDS, get_user_playlists, get_playlist_info
+from transfer import sync_playlist
+from preview import new_preview_id, preview_playlist, load_preview, preview_summary, commit_preview
+from match_cache import get_match_cache
+from jobs import submit_job, resume_job, get_job, watch_job, get_missed_tracks
+from quota import youtube_quota, QuotaExhausted
+from state_store import get_state_store, StateStoreSessionInterface
+import metrics
+from tracing import list_traces, trace_path
+from singleflight import SingleFlight
+import gzip
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 from auth import (
     get_spotify_oauth, get_youtube_oauth_flow, generate_state_token,
-    get_spotify_client, is_spotify_authenticated, is_youtube_authenticated
+    get_spotify_client, is_spotify_authenticated, is_youtube_authenticated,
+    youtube_credentials_dict, spotify_user_key
 )
 import secrets
 
@@ -18,9 +31,13 @@ load_dotenv(dotenv_path=env_path)
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production')
 
-# Simple in-memory state storage
-# For production with multiple containers, use Redis or a database
-oauth_states = {}
+# OAuth states live in the shared state store so the callback can land on any
+# worker; unused states expire after OAUTH_STATE_TTL seconds
+OAUTH_STATE_TTL = int(os.getenv('OAUTH_STATE_TTL', '600'))
+oauth_states = get_state_store()
+
+# Bearer token for the /admin routes; they are disabled when it is unset
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
 
 # Configure session
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
@@ -31,6 +48,9 @@ app.config['SESSION_COOKIE_PATH'] = '/'
 app.config['SESSION_COOKIE_DOMAIN'] = None  # Allow localhost and 127.0.0.1
 app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hour
 
+# Server-side sessions in the same store, shared by every worker
+app.session_interface = StateStoreSessionInterface(app)
+
 # CORS configuration for local development and Docker
 allowed_origins = [
     os.getenv('FRONTEND_URL', 'http://localhost:3000'),
@@ -47,6 +67,31 @@ CORS(app,
      methods=["GET", "POST", "OPTIONS"]
 )
 
+# Every worker publishes its metrics so /metrics can report the whole host
+app.before_request(metrics.start_publisher)
+
+# JSON responses at least this large are gzipped for clients that accept it
+GZIP_MIN_SIZE = 1024
+GZIP_MIMETYPES = {'application/json', 'application/x-ndjson'}
+
+
+@app.after_request
+def gzip_response(response):
+    """Compress large JSON bodies; streamed responses (SSE) are left alone"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype not in GZIP_MIMETYPES or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in request.headers.get('Accept-Encoding', '') or response.content_length < GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    # The ETag (if any) describes the uncompressed body, so it can only be a weak validator now
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
 
 @app.route('/', methods=['GET'])
 def home():
@@ -60,9 +105,9 @@ def home():
 def spotify_auth():
     """Initiate Spotify OAuth flow"""
     state = generate_state_token()
-    # Store state both in session AND in-memory for fallback
+    # Store state both in session AND in the state store for fallback
     session['spotify_oauth_state'] = state
-    oauth_states[state] = {'timestamp': __import__('time').time(), 'type': 'spotify'}
+    oauth_states.set(f'oauth_state:{state}', 'spotify', OAUTH_STATE_TTL)
     session.permanent = True
     session.modified = True
     
@@ -79,9 +124,10 @@ def spotify_callback():
     code = request.args.get('code')
     state = request.args.get('state')
     
-    # Try session first, fallback to in-memory
+    # Try session first, fallback to the state store (states are single use)
     stored_state = session.get('spotify_oauth_state')
-    valid_state = stored_state == state if stored_state else state in oauth_states
+    stored_type = oauth_states.pop(f'oauth_state:{state}') if state else None
+    valid_state = stored_state == state if stored_state else stored_type == 'spotify'
     
     # Verify state
     if not valid_state:
@@ -89,7 +135,6 @@ def spotify_callback():
     
     # Clear the state after use
     session.pop('spotify_oauth_state', None)
-    oauth_states.pop(state, None)
     
     sp_oauth = get_spotify_oauth()
     try:
@@ -134,9 +179,9 @@ def youtube_auth():
     try:
         flow = get_youtube_oauth_flow()
         state = generate_state_token()
-        # Store state both in session AND in-memory for fallback
+        # Store state both in session AND in the state store for fallback
         session['youtube_oauth_state'] = state
-        oauth_states[state] = {'timestamp': __import__('time').time(), 'type': 'youtube'}
+        oauth_states.set(f'oauth_state:{state}', 'youtube', OAUTH_STATE_TTL)
         session.permanent = True
         session.modified = True
         
@@ -162,9 +207,10 @@ def youtube_callback():
     code = request.args.get('code')
     state = request.args.get('state')
     
-    # Try session first, fallback to in-memory
+    # Try session first, fallback to the state store (states are single use)
     stored_state = session.get('youtube_oauth_state')
-    valid_state = stored_state == state if stored_state else state in oauth_states
+    stored_type = oauth_states.pop(f'oauth_state:{state}') if state else None
+    valid_state = stored_state == state if stored_state else stored_type == 'youtube'
     
     # Verify state
     if not valid_state:
@@ -172,24 +218,19 @@ def youtube_callback():
     
     # Clear the state after use
     session.pop('youtube_oauth_state', None)
-    oauth_states.pop(state, None)
     
     try:
         flow = get_youtube_oauth_flow()
         flow.fetch_token(code=code)
         
-        credentials = flow.credentials
-        
-        youtube_creds = {
-            'token': credentials.token,
-            'refresh_token': credentials.refresh_token,
-            'token_uri': credentials.token_uri,
-            'client_id': credentials.client_id,
-            'client_secret': credentials.client_secret,
-            'scopes': credentials.scopes
-        }
-        
-        session['youtube_credentials'] = youtube_creds
+        credentials = youtube_credentials_dict(flow.credentials)
+        try:
+            # Manifests and playlist indexes are keyed on the channel, which
+            # outlives the refresh token replaced at every login
+            credentials['channel_id'] = get_channel_id(build_youtube_client(credentials))
+        except Exception as channel_error:
+            print(f"⚠ Could not look up the YouTube channel: {channel_error}")
+        session['youtube_credentials'] = credentials
         session.permanent = True
         session.modified = True
         
@@ -221,54 +262,504 @@ def youtube_logout():
 
 # ===== PLAYLIST ROUTES =====
 
+# Seconds a user's playlist listing is reused before Spotify is asked again
+PLAYLISTS_CACHE_TTL = int(os.getenv('PLAYLISTS_CACHE_TTL', '60'))
+# Page size of /playlists by default and at most
+PLAYLISTS_PAGE_SIZE = 50
+PLAYLISTS_PAGE_LIMIT = 200
+
+# Concurrent listings of one user's playlists share one walk through Spotify
+playlist_loads = SingleFlight()
+
+
+def cached_user_playlists(token_info, refresh=False):
+    """A user's playlists, from the state store if listed in the last PLAYLISTS_CACHE_TTL seconds"""
+    key = f'playlists:{spotify_user_key(token_info)}'
+    store = get_state_store()
+    if not refresh:
+        cached = store.get(key)
+        if cached:
+            return json.loads(cached)
+    
+    def load():
+        playlists = get_user_playlists(get_spotify_client(token_info))
+        store.set(key, json.dumps(playlists), PLAYLISTS_CACHE_TTL)
+        return playlists
+    
+    return playlist_loads.do(key, load)
+
+
 @app.route('/playlists', methods=['GET'])
 def get_playlists():
-    """Get user's Spotify playlists"""
+    """
+    Get a page of the user's Spotify playlists.
+    
+    ?cursor= (the next_cursor of the previous page) and ?limit= select the
+    page, ?fields= (comma separated, e.g. id,name,tracks_total) trims each
+    playlist, and ?refresh=1 skips the cached listing. Responses carry an
+    ETag, so a client sending If-None-Match gets 304 when nothing changed.
+    """
     if not is_spotify_authenticated():
         return {"error": "Not authenticated with Spotify"}, 401
     
+    try:
+        offset = max(0, int(request.args.get('cursor') or 0))
+        limit = min(PLAYLISTS_PAGE_LIMIT, max(1, int(request.args.get('limit', PLAYLISTS_PAGE_SIZE))))
+    except ValueError:
+        return {"error": "Invalid cursor or limit"}, 400
+    fields = [f for f in request.args.get('fields', '').split(',') if f] or list(PLAYLIST_FIELDS)
+    unknown = set(fields) - set(PLAYLIST_FIELDS)
+    if unknown:
+        return {"error": f"Unknown fields: {', '.join(sorted(unknown))}"}, 400
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    
     try:
         token_info = session.get('spotify_token_info')
-        sp = get_spotify_client(token_info)
-        playlists = get_user_playlists(sp)
-        return {"playlists": playlists}, 200
+        playlists = cached_user_playlists(token_info, refresh=request.args.get('refresh') == '1')
+        end = offset + limit
+        response = jsonify({
+            "playlists": [{field: p.get(field) for field in fields} for p in playlists[offset:end]],
+            "total": len(playlists),
+            "next_cursor": str(end) if end < len(playlists) else None
+        })
+        # Cached by the browser but revalidated on every load
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.add_etag()
+        return response.make_conditional(request)
     except Exception as e:
         import traceback
         traceback.print_exc()
         return {"error": str(e)}, 500
 
 
+def run_transfer(job, token_info, creds_dict, playlist_id, prune=False):
+    """Background transfer: stream new Spotify tracks into the YouTube Music playlist"""
+    job.set_stage('fetching_spotify')
+    sp = get_spotify_client(token_info)
+    info = get_playlist_info(sp, playlist_id)
+    job.set_stage('transferring', tracks_total=info['tracks_total'])
+    
+    summary = sync_playlist(sp, creds_dict, playlist_id, progress=job, info=info, prune=prune, trace=job.trace)
+    
+    message = "Playlist is already up to date" if summary["unchanged"] else "Playlist transferred successfully!"
+    return {"message": message, **summary}
+
+
 @app.route('/transfer/<playlist_id>', methods=['POST'])
 def transfer_playlist(playlist_id):
-    """Transfer a Spotify playlist to YouTube Music"""
+    """Start a background transfer of a Spotify playlist to YouTube Music"""
     if not is_spotify_authenticated():
         return {"error": "Not authenticated with Spotify"}, 401
     
     if not is_youtube_authenticated():
         return {"error": "Not authenticated with YouTube Music"}, 401
     
+    # Optional {"prune": true}: also remove songs for tracks deleted on Spotify
+    prune = bool((request.get_json(silent=True) or {}).get('prune'))
+    
     try:
-        # Get Spotify tracks
+        # Capture credentials now: the job runs outside the request context
         token_info = session.get('spotify_token_info')
-        sp = get_spotify_client(token_info)
-        tracks, playlist_name = get_playlist_tracks_oauth(sp, playlist_id)
+        creds_dict = session.get('youtube_credentials')
+        job = submit_job(
+            playlist_id, run_transfer, token_info, creds_dict, playlist_id, prune,
+            resume={"kind": "playlist", "playlist_id": playlist_id, "prune": prune}
+        )
+        
+        # Remember which jobs belong to this session
+        session['transfer_jobs'] = (session.get('transfer_jobs') or [])[-19:] + [job.id]
+        session.modified = True
         
-        # Get YouTube credentials (pass as dict)
+        return {
+            "job_id": job.id,
+            "status_url": f"/transfer/jobs/{job.id}"
+        }, 202
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return {"error": str(e)}, 500
+
+
+def run_bulk_transfer(job, token_info, creds_dict, playlist_ids):
+    """
+    Background transfer of several playlists as one job.
+    
+    The Spotify client, YouTube client and search results are shared by every
+    playlist; a failure in one playlist does not stop the rest.
+    """
+    job.set_stage('fetching_spotify')
+    sp = get_spotify_client(token_info)
+    if playlist_ids == 'all':
+        playlists = [(p['id'], p) for p in get_user_playlists(sp)]
+    else:
+        playlists = [(pid, get_playlist_info(sp, pid)) for pid in playlist_ids]
+    job.set_stage('transferring', tracks_total=sum(info['tracks_total'] for _, info in playlists))
+    
+    youtube = build_youtube_client(creds_dict, usage=job)
+    ytmusic = get_ytmusic()
+    memo = {}
+    
+    transferred = 0
+    for playlist_id, info in playlists:
+        summary = {"playlist_id": playlist_id, "playlist_name": info['name']}
+        try:
+            summary.update(sync_playlist(
+                sp, creds_dict, playlist_id, progress=job, info=info,
+                youtube=youtube, ytmusic=ytmusic, memo=memo, trace=job.trace
+            ))
+            summary["status"] = "completed"
+            transferred += 1
+        except QuotaExhausted:
+            # No point trying the remaining playlists until the quota resets
+            job.playlist_finished({**summary, "status": "quota_exhausted"})
+            raise
+        except Exception as e:
+            summary["status"] = "failed"
+            summary["error"] = str(e)
+        job.playlist_finished(summary)
+    
+    return {
+        "message": f"Transferred {transferred} of {len(playlists)} playlists",
+        "playlists": job.to_dict()['playlists']
+    }
+
+
+@app.route('/transfer/bulk', methods=['POST'])
+def transfer_playlists_bulk():
+    """Start one background job transferring several playlists (or "all")"""
+    if not is_spotify_authenticated():
+        return {"error": "Not authenticated with Spotify"}, 401
+    
+    if not is_youtube_authenticated():
+        return {"error": "Not authenticated with YouTube Music"}, 401
+    
+    playlist_ids = (request.get_json(silent=True) or {}).get('playlist_ids')
+    valid = playlist_ids == 'all' or (
+        isinstance(playlist_ids, list) and playlist_ids and all(isinstance(pid, str) for pid in playlist_ids)
+    )
+    if not valid:
+        return {"error": "playlist_ids must be a non-empty list of ids or \"all\""}, 400
+    
+    try:
+        token_info = session.get('spotify_token_info')
         creds_dict = session.get('youtube_credentials')
+        job = submit_job(
+            'bulk', run_bulk_transfer, token_info, creds_dict, playlist_ids,
+            resume={"kind": "bulk", "playlist_ids": playlist_ids}
+        )
+        
+        session['transfer_jobs'] = (session.get('transfer_jobs') or [])[-19:] + [job.id]
+        session.modified = True
+        
+        return {
+            "job_id": job.id,
+            "status_url": f"/transfer/jobs/{job.id}"
+        }, 202
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return {"error": str(e)}, 500
+
+
+def run_preview(job, token_info, playlist_id, preview_id):
+    """Background match preview: search every track, store the matches, insert nothing"""
+    job.set_stage('fetching_spotify')
+    sp = get_spotify_client(token_info)
+    info = get_playlist_info(sp, playlist_id)
+    job.set_stage('searching', tracks_total=info['tracks_total'])
+    
+    summary = preview_playlist(sp, playlist_id, preview_id, progress=job, info=info, trace=job.trace)
+    return {"message": "Preview ready", **summary, "preview_url": f"/transfer/previews/{preview_id}"}
+
+
+@app.route('/transfer/<playlist_id>/preview', methods=['POST'])
+def preview_transfer(playlist_id):
+    """
+    Start a background match preview of a Spotify playlist.
+    
+    Only YouTube Music is searched, so a preview costs no YouTube API quota.
+    When the job completes its result carries the preview_id to inspect and
+    commit.
+    """
+    if not is_spotify_authenticated():
+        return {"error": "Not authenticated with Spotify"}, 401
+    
+    try:
+        token_info = session.get('spotify_token_info')
+        preview_id = new_preview_id()
+        # Not resumable: a new preview is cheap, since earlier searches are in the match cache
+        job = submit_job(playlist_id, run_preview, token_info, playlist_id, preview_id)
         
-        # Create YouTube Music playlist
-        missed_tracks = create_ytm_playlist_oauth(creds_dict, tracks, playlist_name)
+        session['transfer_jobs'] = (session.get('transfer_jobs') or [])[-19:] + [job.id]
+        session['transfer_previews'] = (session.get('transfer_previews') or [])[-19:] + [preview_id]
+        session.modified = True
         
         return {
-            "message": "Playlist transferred successfully!",
-            "missed_tracks": missed_tracks
-        }, 200
+            "job_id": job.id,
+            "preview_id": preview_id,
+            "status_url": f"/transfer/jobs/{job.id}"
+        }, 202
     except Exception as e:
         import traceback
         traceback.print_exc()
         return {"error": str(e)}, 500
 
 
+# Largest page of previewed tracks returned at once
+PREVIEW_PAGE_LIMIT = 500
+
+# A progress stream holds a request thread, so it is closed after this many
+# seconds and the browser reconnects from Last-Event-ID
+JOB_STREAM_MAX_SECONDS = int(os.getenv('JOB_STREAM_MAX_SECONDS', '30'))
+# Milliseconds the browser waits before reconnecting a closed stream
+JOB_STREAM_RETRY_MS = 500
+
+
+@app.route('/transfer/previews/<preview_id>', methods=['GET'])
+def transfer_preview(preview_id):
+    """
+    Page through a finished preview's proposed matches.
+    
+    ?offset= and ?limit= (at most PREVIEW_PAGE_LIMIT) select the page, and
+    ?only=matched, ?only=missed or ?only=failed restricts it to those tracks.
+    """
+    preview = load_preview(preview_id) if preview_id in (session.get('transfer_previews') or []) else None
+    if not preview:
+        return {"error": "Preview not found, not finished or expired"}, 404
+    
+    only = request.args.get('only')
+    if only not in (None, 'matched', 'missed', 'failed'):
+        return {"error": "only must be matched, missed or failed"}, 400
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(PREVIEW_PAGE_LIMIT, max(1, int(request.args.get('limit', 100))))
+    except ValueError:
+        return {"error": "Invalid offset or limit"}, 400
+    
+    return preview_summary(preview, offset, limit, only), 200
+
+
+def run_commit(job, creds_dict, preview_id, prune=False):
+    """Background insert of a stored preview's matches, without searching again"""
+    preview = load_preview(preview_id)
+    if not preview:
+        raise Exception("The preview has expired; preview the playlist again")
+    job.set_stage('transferring', tracks_total=len(preview['tracks']))
+    
+    summary = commit_preview(creds_dict, preview, progress=job, prune=prune, trace=job.trace)
+    
+    message = "Playlist is already up to date" if summary["unchanged"] else "Playlist transferred successfully!"
+    return {"message": message, **summary}
+
+
+@app.route('/transfer/previews/<preview_id>/commit', methods=['POST'])
+def commit_transfer_preview(preview_id):
+    """Start a background transfer that inserts a preview's matches; accepts {"prune": true}"""
+    if not is_youtube_authenticated():
+        return {"error": "Not authenticated with YouTube Music"}, 401
+    
+    preview = load_preview(preview_id) if preview_id in (session.get('transfer_previews') or []) else None
+    if not preview:
+        return {"error": "Preview not found, not finished or expired"}, 404
+    
+    prune = bool((request.get_json(silent=True) or {}).get('prune'))
+    
+    try:
+        creds_dict = session.get('youtube_credentials')
+        job = submit_job(
+            preview['playlist_id'], run_commit, creds_dict, preview_id, prune,
+            resume={"kind": "commit", "preview_id": preview_id, "prune": prune}
+        )
+        
+        session['transfer_jobs'] = (session.get('transfer_jobs') or [])[-19:] + [job.id]
+        session.modified = True
+        
+        return {
+            "job_id": job.id,
+            "status_url": f"/transfer/jobs/{job.id}"
+        }, 202
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return {"error": str(e)}, 500
+
+
+@app.route('/transfer/jobs/<job_id>', methods=['GET'])
+def transfer_job_status(job_id):
+    """Report progress of a background transfer"""
+    job = get_job(job_id)
+    if not job or job_id not in (session.get('transfer_jobs') or []):
+        return {"error": "Transfer job not found"}, 404
+    return job.to_dict(), 200
+
+
+# Largest page of missed tracks returned at once
+MISSED_PAGE_LIMIT = 500
+
+
+@app.route('/transfer/jobs/<job_id>/missed', methods=['GET'])
+def transfer_job_missed(job_id):
+    """
+    Page through the tracks a transfer could not find on YouTube Music.
+    
+    ?offset= and ?limit= (at most MISSED_PAGE_LIMIT) select the page. While the
+    job runs, tracks missed since its last checkpoint (a few seconds) are not
+    listed yet.
+    """
+    job = get_job(job_id)
+    if not job or job_id not in (session.get('transfer_jobs') or []):
+        return {"error": "Transfer job not found"}, 404
+    
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(MISSED_PAGE_LIMIT, max(1, int(request.args.get('limit', 100))))
+    except ValueError:
+        return {"error": "Invalid offset or limit"}, 400
+    
+    count = job.to_dict()['missed_tracks']['count']
+    tracks = get_missed_tracks(job, offset, min(limit, count - offset)) if offset < count else []
+    return {"count": count, "offset": offset, "tracks": tracks}, 200
+
+
+@app.route('/transfer/jobs/<job_id>/events', methods=['GET'])
+def transfer_job_events(job_id):
+    """
+    Stream a transfer's progress as Server-Sent Events.
+    
+    Per-track events (matched, missed, search_failed, skipped, inserted,
+    failed) carry their sequence number as the SSE id, so a reconnecting
+    EventSource resumes from Last-Event-ID (or ?cursor=). 'progress'
+    snapshots with rate and ETA are sent every second, and 'end' carries the
+    final job status. Each stream lasts at most JOB_STREAM_MAX_SECONDS so it
+    doesn't hold a worker thread for a whole transfer; EventSource reconnects
+    on its own.
+    """
+    job = get_job(job_id)
+    if not job or job_id not in (session.get('transfer_jobs') or []):
+        return {"error": "Transfer job not found"}, 404
+    
+    try:
+        cursor = int(request.headers.get('Last-Event-ID') or request.args.get('cursor') or 0)
+    except ValueError:
+        return {"error": "Invalid cursor"}, 400
+    
+    def stream():
+        yield f"retry: {JOB_STREAM_RETRY_MS}\n\n"
+        for event in watch_job(job_id, cursor, JOB_STREAM_MAX_SECONDS):
+            event_id = f"id: {event['seq']}\n" if 'seq' in event else ''
+            yield f"{event_id}event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Don't let a proxy buffer the stream
+    })
+
+
+@app.route('/transfer/jobs/<job_id>/resume', methods=['POST'])
+def resume_transfer_job(job_id):
+    """
+    Resume a failed, quota-exhausted or interrupted transfer.
+    
+    Tracks already transferred are skipped and earlier search results come from
+    the match cache, so the job continues from its last checkpoint.
+    """
+    job = get_job(job_id)
+    if not job or job_id not in (session.get('transfer_jobs') or []):
+        return {"error": "Transfer job not found"}, 404
+    
+    params = job.resume or {}
+    # A committed preview is inserted from the stored matches and needs no Spotify access
+    if params.get('kind') != 'commit' and not is_spotify_authenticated():
+        return {"error": "Not authenticated with Spotify"}, 401
+    
+    if not is_youtube_authenticated():
+        return {"error": "Not authenticated with YouTube Music"}, 401
+    
+    if not job.to_dict()['resumable']:
+        return {"error": f"Transfer job is {job.status} and cannot be resumed"}, 409
+    
+    try:
+        token_info = session.get('spotify_token_info')
+        creds_dict = session.get('youtube_credentials')
+        if params['kind'] == 'bulk':
+            resumed = resume_job(job, run_bulk_transfer, token_info, creds_dict, params['playlist_ids'])
+        elif params['kind'] == 'commit':
+            resumed = resume_job(job, run_commit, creds_dict, params['preview_id'], params['prune'])
+        else:
+            resumed = resume_job(job, run_transfer, token_info, creds_dict, params['playlist_id'], params['prune'])
+        if not resumed:
+            return {"error": "Transfer job is already running"}, 409
+        
+        return {
+            "job_id": job.id,
+            "status_url": f"/transfer/jobs/{job.id}"
+        }, 202
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return {"error": str(e)}, 500
+
+
+# ===== STATS ROUTES =====
+
+@app.route('/stats/match-cache', methods=['GET'])
+def match_cache_stats():
+    """Report track match cache hit/miss counters, summed over all workers"""
+    merged = metrics.collect()
+    stats = get_match_cache().stats(merged)
+    stats['coalesced_searches'] = merged.get(metrics.COALESCED_CALLS.name, {}).get((inflight_searches.name,), 0)
+    return stats, 200
+
+
+@app.route('/stats/youtube-quota', methods=['GET'])
+def youtube_quota_stats():
+    """
+    Report YouTube Data API units used today by all workers, which share the
+    ledger; exhausted and rate_qps are this worker's own.
+    """
+    return youtube_quota.stats(), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Report stage latencies, track counts and upstream errors for Prometheus, summed over all workers"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+# ===== ADMIN ROUTES =====
+
+def admin_denied():
+    """Return an error response unless the request carries the admin token"""
+    if not ADMIN_TOKEN:
+        return {"error": "Admin endpoints are disabled"}, 404
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not secrets.compare_digest(supplied.encode(), ADMIN_TOKEN.encode()):
+        return {"error": "Invalid admin token"}, 401
+    return None
+
+
+@app.route('/admin/traces', methods=['GET'])
+def admin_list_traces():
+    """List the retained transfer traces, newest first"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    return {"traces": list_traces()}, 200
+
+
+@app.route('/admin/traces/<job_id>', methods=['GET'])
+def admin_get_trace(job_id):
+    """Return a transfer's trace as JSON lines: one record per span, plus a summary per attempt"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    path = trace_path(job_id)
+    if path is None or not path.exists():
+        return {"error": "Trace not found"}, 404
+    return Response(path.read_bytes(), mimetype='application/x-ndjson')
+
+
 if __name__ == '__main__':
     # Startup message is handled by Gunicorn config
     app.run(host='0.0.0.0', port=8080, debug=False)
\ No newline at end of file
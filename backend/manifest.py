@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load .env from root directory (parent of backend)
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+MANIFEST_PATH = os.getenv('MANIFEST_PATH', str(Path(__file__).parent / 'data' / 'manifests.db'))
+
+
+class Manifest:
+    """
+    What was transferred from one Spotify playlist into one user's YouTube playlist.
+
+    tracks maps a Spotify track id to {'video_id', 'item_id'}: video_id is None
+    for a track that was not found, item_id is the playlistItem we inserted
+    (None if the song was already in the playlist).
+    """
+
+    def __init__(self, user_key, playlist_id, snapshot_id=None, youtube_playlist_id=None, tracks=None):
+        self.user_key = user_key
+        self.playlist_id = playlist_id
+        self.snapshot_id = snapshot_id
+        self.youtube_playlist_id = youtube_playlist_id
+        self.tracks = tracks or {}
+
+    def reset(self):
+        """Forget the previous sync"""
+        self.snapshot_id = None
+        self.youtube_playlist_id = None
+        self.tracks = {}
+
+    def is_matched(self, track):
+        """True if the track was already found and is in the YouTube playlist"""
+        entry = self.tracks.get(track.id)
+        return bool(entry and entry['video_id'])
+
+    def has_matches(self):
+        return any(entry['video_id'] for entry in self.tracks.values())
+
+    def record(self, track, video_id, item_id=None):
+        """Record the outcome for a track; tracks without a Spotify id are not tracked"""
+        if not track.id:
+            return
+        self.tracks[track.id] = {'video_id': video_id, 'item_id': item_id}
+
+    def missed_tracks(self):
+        """Count of tracks not found, in the same shape create_ytm_playlist_oauth returns"""
+        return {
+            "count": sum(1 for entry in self.tracks.values() if not entry['video_id']),
+            "search_failed": 0
+        }
+
+
+class ManifestStore:
+    """SQLite-backed store of Manifests keyed on (user, Spotify playlist)"""
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self._local = threading.local()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS manifests (
+                user_key TEXT NOT NULL,
+                playlist_id TEXT NOT NULL,
+                snapshot_id TEXT,
+                youtube_playlist_id TEXT,
+                tracks TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (user_key, playlist_id)
+            )
+        ''')
+        conn.commit()
+
+    def _conn(self):
+        # SQLite connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def load(self, user_key, playlist_id):
+        """Return the stored Manifest, or a new empty one"""
+        row = self._conn().execute(
+            'SELECT snapshot_id, youtube_playlist_id, tracks FROM manifests '
+            'WHERE user_key = ? AND playlist_id = ?',
+            (user_key, playlist_id)
+        ).fetchone()
+        if not row:
+            return Manifest(user_key, playlist_id)
+        snapshot_id, youtube_playlist_id, tracks = row
+        return Manifest(user_key, playlist_id, snapshot_id, youtube_playlist_id, json.loads(tracks))
+
+    def save(self, manifest):
+        conn = self._conn()
+        conn.execute(
+            'INSERT OR REPLACE INTO manifests '
+            '(user_key, playlist_id, snapshot_id, youtube_playlist_id, tracks, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (manifest.user_key, manifest.playlist_id, manifest.snapshot_id,
+             manifest.youtube_playlist_id, json.dumps(manifest.tracks), time.time())
+        )
+        conn.commit()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_manifest_store():
+    """Return the process-wide manifest store, creating it on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ManifestStore()
+        return _store
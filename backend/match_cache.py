@@ -0,0 +1,183 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from dotenv import load_dotenv
+from metrics import MATCH_CACHE_LOOKUPS, collect
+
+# Load .env from root directory (parent of backend)
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# Match cache configuration
+MATCH_CACHE_PATH = os.getenv('MATCH_CACHE_PATH', str(Path(__file__).parent / 'data' / 'match_cache.db'))
+MATCH_CACHE_TTL = int(os.getenv('MATCH_CACHE_TTL', str(30 * 24 * 3600)))  # Found matches: 30 days
+MATCH_CACHE_NEGATIVE_TTL = int(os.getenv('MATCH_CACHE_NEGATIVE_TTL', str(24 * 3600)))  # Misses: 1 day
+MATCH_CACHE_MAX_ENTRIES = int(os.getenv('MATCH_CACHE_MAX_ENTRIES', '100000'))
+
+# How many writes between eviction sweeps
+EVICTION_INTERVAL = 500
+
+
+def normalize(text):
+    """Normalize a title or artist name for use in a cache key"""
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+
+def query_key(track):
+    """Key identifying the YouTube Music search a Track turns into"""
+    return f"query:{normalize(track.name)}|{normalize(track.artist)}"
+
+
+def track_keys(track):
+    """Return the cache keys for a Track, most specific first"""
+    keys = []
+    if track.id:
+        keys.append(f"spotify:{track.id}")
+    keys.append(query_key(track))
+    return keys
+
+
+class MatchCache:
+    """
+    Persistent track -> videoId cache backed by SQLite.
+
+    Found matches and misses (negative entries, stored with a NULL videoId) are
+    kept with separate TTLs. The table is bounded to max_entries rows by
+    evicting the least recently used entries.
+    """
+
+    def __init__(self, path=MATCH_CACHE_PATH, ttl=MATCH_CACHE_TTL,
+                 negative_ttl=MATCH_CACHE_NEGATIVE_TTL, max_entries=MATCH_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS matches (
+                key TEXT PRIMARY KEY,
+                video_id TEXT,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS matches_last_used ON matches (last_used)')
+        conn.commit()
+
+    def _conn(self):
+        # SQLite connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, track):
+        """
+        Look up a track.
+
+        Returns:
+            (hit, video_id): hit is False when the track must be searched;
+            video_id is None for a cached miss
+        """
+        now = time.time()
+        conn = self._conn()
+        for key in track_keys(track):
+            row = conn.execute(
+                'SELECT video_id, created_at FROM matches WHERE key = ?', (key,)
+            ).fetchone()
+            if not row:
+                continue
+            video_id, created_at = row
+            ttl = self.ttl if video_id else self.negative_ttl
+            if now - created_at > ttl:
+                continue
+            conn.execute('UPDATE matches SET last_used = ? WHERE key = ?', (now, key))
+            conn.commit()
+            MATCH_CACHE_LOOKUPS.inc('hit' if video_id else 'negative_hit')
+            return True, video_id
+        MATCH_CACHE_LOOKUPS.inc('miss')
+        return False, None
+
+    def set(self, track, video_id):
+        """Store a search result for a track (video_id None records a miss)"""
+        now = time.time()
+        conn = self._conn()
+        conn.executemany(
+            'INSERT OR REPLACE INTO matches (key, video_id, created_at, last_used) VALUES (?, ?, ?, ?)',
+            [(key, video_id, now, now) for key in track_keys(track)]
+        )
+        conn.commit()
+
+        with self._lock:
+            self._writes += 1
+            sweep = self._writes % EVICTION_INTERVAL == 0
+        if sweep:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones above max_entries"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            'DELETE FROM matches WHERE (video_id IS NOT NULL AND created_at < ?) '
+            'OR (video_id IS NULL AND created_at < ?)',
+            (now - self.ttl, now - self.negative_ttl)
+        )
+        excess = conn.execute('SELECT COUNT(*) FROM matches').fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                'DELETE FROM matches WHERE key IN '
+                '(SELECT key FROM matches ORDER BY last_used ASC LIMIT ?)',
+                (excess,)
+            )
+        conn.commit()
+
+    def stats(self, merged=None):
+        """
+        Return hit/miss counters summed over all workers and the current table size.
+
+        merged is a metrics.collect() result to read the counters from; one is
+        collected if not given.
+        """
+        entries = self._conn().execute('SELECT COUNT(*) FROM matches').fetchone()[0]
+        merged = collect() if merged is None else merged
+        lookups = merged.get(MATCH_CACHE_LOOKUPS.name, {})
+        hits = lookups.get(('hit',), 0)
+        negative_hits = lookups.get(('negative_hit',), 0)
+        misses = lookups.get(('miss',), 0)
+        total = hits + negative_hits + misses
+        return {
+            'hits': hits,
+            'negative_hits': negative_hits,
+            'misses': misses,
+            'hit_rate': round((hits + negative_hits) / total, 4) if total else 0.0,
+            'entries': entries,
+            'max_entries': self.max_entries
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_match_cache():
+    """Return the process-wide match cache, creating it on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MatchCache()
+        return _cache
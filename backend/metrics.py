@@ -0,0 +1,272 @@
+import json
+import os
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from dotenv import load_dotenv
+from state_store import get_state_store
+
+# Load .env from root directory (parent of backend)
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# Seconds between publishes of this worker's metrics to the state store
+METRICS_PUBLISH_INTERVAL = float(os.getenv('METRICS_PUBLISH_INTERVAL', '5'))
+
+# Latency buckets (seconds), from a cached lookup up to a slow batch insert
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values tuple -> value
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally split by label values"""
+
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, e.g. work in progress"""
+
+    kind = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in fixed buckets.
+
+    An observation is one bisect and three additions under the metric's
+    lock; buckets are only made cumulative when rendered.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            # [count per bucket..., count above the last bucket, sum, count]
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 3)
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), list(state)] for labels, state in self._values.items()]
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the duration of the with block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+
+# ===== TRANSFER METRICS =====
+
+SPOTIFY_PAGE_SECONDS = Histogram(
+    'stoy_spotify_page_seconds', 'Time to fetch one page of a Spotify listing'
+)
+YTM_SEARCH_SECONDS = Histogram(
+    'stoy_ytm_search_seconds', 'Time for one YouTube Music search'
+)
+PLAYLIST_SCAN_SECONDS = Histogram(
+    'stoy_playlist_scan_seconds', 'Time to page through a YouTube listing for the playlist index',
+    ['resource']
+)
+YOUTUBE_REQUEST_SECONDS = Histogram(
+    'stoy_youtube_request_seconds',
+    'Time for one YouTube Data API call (playlistItems.insert.batch is a whole batch of inserts)',
+    ['method']
+)
+TRACKS = Counter(
+    'stoy_tracks_total', 'Tracks handled by transfers, by result', ['result']
+)
+UPSTREAM_ERRORS = Counter(
+    'stoy_upstream_errors_total', 'Failed upstream calls, by service and HTTP status', ['service', 'status']
+)
+UPSTREAM_RETRIES = Counter(
+    'stoy_upstream_retries_total', 'Retried upstream calls, by service and HTTP status', ['service', 'status']
+)
+TRANSFERS_IN_FLIGHT = Gauge(
+    'stoy_transfers_in_flight', 'Transfer jobs currently running'
+)
+YTM_SEARCH_HEDGES = Counter(
+    'stoy_ytm_search_hedges_total',
+    'Duplicate YouTube Music searches sent for slow ones (sent), and how often the duplicate answered first (won)',
+    ['outcome']
+)
+MATCH_CACHE_LOOKUPS = Counter(
+    'stoy_match_cache_lookups_total', 'Track match cache lookups, by result (hit, negative_hit or miss)', ['result']
+)
+COALESCED_CALLS = Counter(
+    'stoy_coalesced_calls_total', 'Calls that waited for an identical call already in flight, by kind', ['name']
+)
+TOKEN_REFRESHES = Counter(
+    'stoy_token_refreshes_total',
+    'OAuth token refreshes by service and mode (background, blocking, or failed background)',
+    ['service', 'mode']
+)
+
+
+# ===== AGGREGATION ACROSS WORKERS =====
+# Each gunicorn worker keeps its own metrics. Workers publish a snapshot to
+# the state store every METRICS_PUBLISH_INTERVAL seconds and /metrics sums
+# the live snapshots, so a scrape sees the whole host whichever worker
+# answers it. A worker that exits drops out of the sums once its snapshot
+# expires, which Prometheus treats like a counter reset.
+
+WORKERS_KEY = 'metrics:workers'
+
+
+def snapshot():
+    """This process's metrics as a JSON-able dict"""
+    return {metric.name: metric.snapshot() for metric in _registry}
+
+
+def _worker_key(pid):
+    return f'metrics:worker:{pid}'
+
+
+def publish(store=None):
+    """Write this worker's snapshot to the state store"""
+    store = store or get_state_store()
+    ttl = METRICS_PUBLISH_INTERVAL * 3
+    pid = os.getpid()
+    store.set(_worker_key(pid), json.dumps(snapshot()), ttl)
+    # Not atomic: a racing worker may drop us from the list until our next publish
+    workers = set(json.loads(store.get(WORKERS_KEY) or '[]'))
+    if pid not in workers:
+        workers.add(pid)
+        store.set(WORKERS_KEY, json.dumps(sorted(workers)), 24 * 3600)
+
+
+def collect(store=None):
+    """Sum the snapshots of every live worker, with this worker's taken fresh"""
+    store = store or get_state_store()
+    own = os.getpid()
+    snapshots = [snapshot()]
+    live = [own]
+    for pid in json.loads(store.get(WORKERS_KEY) or '[]'):
+        if pid == own:
+            continue
+        data = store.get(_worker_key(pid))
+        if data:
+            snapshots.append(json.loads(data))
+            live.append(pid)
+    store.set(WORKERS_KEY, json.dumps(sorted(live)), 24 * 3600)
+
+    merged = {}
+    for data in snapshots:
+        for name, series in data.items():
+            totals = merged.setdefault(name, {})
+            for labels, value in series:
+                key = tuple(labels)
+                if isinstance(value, list):
+                    previous = totals.get(key, [0] * len(value))
+                    totals[key] = [a + b for a, b in zip(previous, value)]
+                else:
+                    totals[key] = totals.get(key, 0) + value
+    return merged
+
+
+def _publish_loop():
+    while True:
+        time.sleep(METRICS_PUBLISH_INTERVAL)
+        try:
+            publish()
+        except Exception:
+            traceback.print_exc()
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def start_publisher():
+    """Start publishing this worker's metrics; cheap to call on every request"""
+    # Started from a request rather than at import, so it runs in the worker, not the gunicorn master
+    global _publisher
+    if _publisher is not None:
+        return
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = threading.Thread(target=_publish_loop, name='metrics-publish', daemon=True)
+            _publisher.start()
+
+
+# ===== EXPOSITION =====
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(merged=None):
+    """Render metrics in the Prometheus text exposition format"""
+    merged = collect() if merged is None else merged
+    lines = []
+    for metric in _registry:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for labels, value in sorted(merged.get(metric.name, {}).items()):
+            if metric.kind != 'histogram':
+                lines.append(f'{metric.name}{_format_labels(metric.labelnames, labels)} {_format_value(value)}')
+                continue
+            cumulative = 0
+            bounds = [repr(float(b)) for b in metric.buckets] + ['+Inf']
+            for bound, count in zip(bounds, value[:-2]):
+                cumulative += count
+                bucket_labels = _format_labels(metric.labelnames, labels, ('le', bound))
+                lines.append(f'{metric.name}_bucket{bucket_labels} {cumulative}')
+            label_text = _format_labels(metric.labelnames, labels)
+            lines.append(f'{metric.name}_sum{label_text} {_format_value(value[-2])}')
+            lines.append(f'{metric.name}_count{label_text} {value[-1]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,189 @@
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+from metrics import PLAYLIST_SCAN_SECONDS
+
+# Load .env from root directory (parent of backend)
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# How long a scanned listing is trusted before it is revalidated (seconds)
+PLAYLIST_INDEX_TTL = int(os.getenv('PLAYLIST_INDEX_TTL', '600'))
+# Users whose index has not been touched for this long are dropped (seconds)
+PLAYLIST_INDEX_IDLE = 24 * 3600
+
+
+# Partial responses: listings keep their ETag, total and page token for
+# revalidation and paging, plus the one field of each item we read
+PLAYLISTS_FIELDS = 'etag,nextPageToken,pageInfo/totalResults,items(id,snippet/title)'
+PLAYLIST_ITEMS_FIELDS = 'etag,nextPageToken,pageInfo/totalResults,items/contentDetails/videoId'
+
+
+def user_key(credentials):
+    """
+    Stable, non-reversible key identifying the user behind a YouTube credentials dict.
+
+    Based on the user's channel id, looked up at login, since every login
+    issues a new refresh token; credentials without one fall back to the
+    refresh token.
+    """
+    secret = credentials.get('channel_id') or credentials.get('refresh_token') or credentials['token']
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+
+def _signature(response):
+    # The first page's ETag plus the total count changes whenever the listing does
+    return response.get('etag'), response.get('pageInfo', {}).get('totalResults')
+
+
+def _scan(name, resource, params, first_response=None):
+    """Page through a list endpoint, returning (signature, items); name labels the scan metric"""
+    with PLAYLIST_SCAN_SECONDS.time(name):
+        request = resource.list(**params)
+        response = first_response or request.execute()
+        signature = _signature(response)
+        items = []
+        while True:
+            items.extend(response.get('items', []))
+            request = resource.list_next(request, response)
+            if not request:
+                return signature, items
+            response = request.execute()
+
+
+class Listing:
+    """Cached result of paging one list endpoint"""
+
+    def __init__(self, signature, data):
+        self.signature = signature
+        self.data = data
+        self.checked_at = time.time()
+
+
+class UserPlaylistIndex:
+    """
+    A user's YouTube playlists indexed by title, plus the video ids of the
+    playlists we have looked inside.
+
+    Our own inserts are recorded directly. After ttl seconds a listing is
+    revalidated by fetching its first page only: if the ETag and total count
+    are unchanged the cached listing is kept, otherwise it is rescanned.
+    """
+
+    def __init__(self, ttl=PLAYLIST_INDEX_TTL):
+        self.ttl = ttl
+        self.lock = threading.RLock()
+        self.titles = None
+        self.items = {}
+        self.touched_at = time.time()
+
+    def _refresh(self, listing, name, resource, params, build):
+        if listing and time.time() - listing.checked_at < self.ttl:
+            return listing
+        if listing:
+            first = resource.list(**params).execute()
+            if _signature(first) == listing.signature:
+                listing.checked_at = time.time()
+                return listing
+            signature, items = _scan(name, resource, params, first)
+        else:
+            signature, items = _scan(name, resource, params)
+        return Listing(signature, build(items))
+
+    def _playlists(self, youtube):
+        # Caller holds self.lock
+        self.touched_at = time.time()
+        self.titles = self._refresh(
+            self.titles, 'playlists', youtube.playlists(),
+            {'part': 'snippet', 'mine': True, 'maxResults': 50, 'fields': PLAYLISTS_FIELDS},
+            self._index_titles
+        )
+        return self.titles.data
+
+    def find_playlist(self, youtube, title):
+        """Return the id of the user's playlist with this title, or None"""
+        with self.lock:
+            return self._playlists(youtube)['by_title'].get(title)
+
+    def has_playlist(self, youtube, playlist_id):
+        """Return True if the user still has a playlist with this id"""
+        if not playlist_id:
+            return False
+        with self.lock:
+            return playlist_id in self._playlists(youtube)['ids']
+
+    @staticmethod
+    def _index_titles(items):
+        by_title = {}
+        for playlist in items:
+            # Keep the first match, like the original linear scan
+            by_title.setdefault(playlist['snippet']['title'], playlist['id'])
+        return {'by_title': by_title, 'ids': {playlist['id'] for playlist in items}}
+
+    def playlist_contents(self, youtube, playlist_id):
+        """
+        Return the contents of a playlist.
+
+        Returns:
+            (video_ids, item_count): set of videoIds and number of items
+        """
+        with self.lock:
+            self.touched_at = time.time()
+            listing = self._refresh(
+                self.items.get(playlist_id), 'playlistItems', youtube.playlistItems(),
+                {'part': 'contentDetails', 'playlistId': playlist_id, 'maxResults': 50,
+                 'fields': PLAYLIST_ITEMS_FIELDS},
+                lambda items: {
+                    'video_ids': {item['contentDetails']['videoId'] for item in items},
+                    'item_count': len(items)
+                }
+            )
+            self.items[playlist_id] = listing
+            return set(listing.data['video_ids']), listing.data['item_count']
+
+    def record_playlist(self, title, playlist_id):
+        """Record a playlist we just created"""
+        with self.lock:
+            if self.titles is not None:
+                self.titles.data['by_title'].setdefault(title, playlist_id)
+                self.titles.data['ids'].add(playlist_id)
+                self.titles.signature = None  # Our change alters the ETag; rescan next revalidation
+            self.items[playlist_id] = Listing(None, {'video_ids': set(), 'item_count': 0})
+
+    def record_items(self, playlist_id, video_ids):
+        """Record videos we just added to a playlist"""
+        with self.lock:
+            listing = self.items.get(playlist_id)
+            if listing is not None:
+                listing.data['video_ids'].update(video_ids)
+                listing.data['item_count'] += len(video_ids)
+                listing.signature = None
+
+    def invalidate(self, playlist_id=None):
+        """Forget a playlist's contents, or the whole index"""
+        with self.lock:
+            if playlist_id:
+                self.items.pop(playlist_id, None)
+            else:
+                self.titles = None
+                self.items = {}
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_playlist_index(credentials):
+    """Return the process-wide playlist index for the user owning these credentials"""
+    key = user_key(credentials)
+    now = time.time()
+    with _indexes_lock:
+        for stale in [k for k, index in _indexes.items() if now - index.touched_at > PLAYLIST_INDEX_IDLE]:
+            del _indexes[stale]
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = UserPlaylistIndex()
+        return index
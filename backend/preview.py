@@ -0,0 +1,148 @@
+import json
+import os
+import secrets
+from pathlib import Path
+from dotenv import load_dotenv
+from clients import get_ytmusic
+from match_cache import get_match_cache, query_key
+from spotify import Track, get_playlist_info, iter_playlist_tracks
+from state_store import get_state_store
+from transfer import sync_playlist
+from ytm import SEARCH_FAILED, search_pipeline
+
+# Load .env from root directory (parent of backend)
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# How long a match preview can be committed after it was made (seconds)
+PREVIEW_TTL = int(os.getenv('PREVIEW_TTL', '86400'))
+
+
+def new_preview_id():
+    return secrets.token_urlsafe(16)
+
+
+def _preview_key(preview_id):
+    return f'preview:{preview_id}'
+
+
+def preview_playlist(sp_client, playlist_id, preview_id, progress=None, info=None, trace=None):
+    """
+    Search YouTube Music for every track of a Spotify playlist without writing anything.
+
+    Runs only the search stage of a transfer (Spotify reads and YouTube Music
+    searches, no YouTube Data API calls, so no quota) and stores the proposed
+    matches in the state store under preview_id for PREVIEW_TTL seconds, for
+    commit_preview to insert later without searching again.
+
+    Tracks whose search kept failing are stored unmatched and listed under
+    'failed', apart from the ones that were not found.
+
+    Returns:
+        Dictionary with preview_id, playlist_name, matched, missed and failed counts
+    """
+    if info is None:
+        info = get_playlist_info(sp_client, playlist_id)
+
+    rows = []
+    failed = []
+    matched = 0
+    tracks = iter_playlist_tracks(sp_client, playlist_id, trace=trace)
+    for track, video_id in search_pipeline(get_ytmusic(), tracks, cache=get_match_cache(), trace=trace):
+        if video_id is SEARCH_FAILED:
+            failed.append(len(rows))
+            rows.append(track.to_list() + [None])
+            if progress:
+                progress.track_search_failed(track.label)
+            continue
+        rows.append(track.to_list() + [video_id])
+        if video_id:
+            matched += 1
+        if progress:
+            if video_id:
+                progress.track_searched(track=track.label, video_id=video_id)
+            else:
+                progress.track_searched(track.label)
+
+    preview = {
+        'preview_id': preview_id,
+        'playlist_id': playlist_id,
+        'playlist_name': info['name'],
+        'snapshot_id': info['snapshot_id'],
+        'tracks': rows,
+        'failed': failed
+    }
+    get_state_store().set(_preview_key(preview_id), json.dumps(preview), PREVIEW_TTL)
+    return {
+        'preview_id': preview_id,
+        'playlist_name': info['name'],
+        'matched': matched,
+        'missed': len(rows) - matched - len(failed),
+        'failed': len(failed)
+    }
+
+
+def load_preview(preview_id):
+    """Return a stored preview, or None if it is unknown or expired"""
+    data = get_state_store().get(_preview_key(preview_id))
+    return json.loads(data) if data else None
+
+
+def preview_summary(preview, offset=0, limit=100, only=None):
+    """
+    One page of a preview's proposed matches, in playlist order.
+
+    only='matched', 'missed' or 'failed' restricts the page to those tracks;
+    offset counts within the restricted list. Failed tracks (whose search
+    kept failing) are not counted as missed.
+    """
+    rows = preview['tracks']
+    failed = set(preview.get('failed', ()))
+    matched = sum(1 for row in rows if row[-1])
+    if only == 'matched':
+        rows = [row for row in rows if row[-1]]
+    elif only == 'missed':
+        rows = [row for index, row in enumerate(rows) if not row[-1] and index not in failed]
+    elif only == 'failed':
+        rows = [rows[index] for index in sorted(failed)]
+    page = []
+    for row in rows[offset:offset + limit]:
+        track = Track.from_list(row[:-1])
+        page.append({'name': track.name, 'artist': track.artist, 'video_id': row[-1]})
+    return {
+        'preview_id': preview['preview_id'],
+        'playlist_id': preview['playlist_id'],
+        'playlist_name': preview['playlist_name'],
+        'matched': matched,
+        'missed': len(preview['tracks']) - matched - len(failed),
+        'failed': len(failed),
+        'count': len(rows),
+        'offset': offset,
+        'tracks': page
+    }
+
+
+def commit_preview(credentials, preview, progress=None, prune=False, trace=None):
+    """
+    Insert a preview's matches into the user's YouTube playlist.
+
+    The tracks are the ones previewed, not re-read from Spotify, and each
+    resolves from a search memo holding the preview's results, so tracks
+    missed by the preview stay missed. Only tracks whose search failed in
+    the preview are left out of the memo and searched now. Otherwise this is
+    sync_playlist: tracks already transferred are skipped and the manifest
+    advances to the previewed snapshot.
+    """
+    tracks = []
+    memo = {}
+    failed = set(preview.get('failed', ()))
+    for index, row in enumerate(preview['tracks']):
+        track = Track.from_list(row[:-1])
+        tracks.append(track)
+        if index not in failed:
+            memo[query_key(track)] = row[-1]
+    info = {'name': preview['playlist_name'], 'snapshot_id': preview['snapshot_id']}
+    return sync_playlist(
+        None, credentials, preview['playlist_id'], progress=progress, info=info,
+        memo=memo, prune=prune, trace=trace, tracks=tracks
+    )
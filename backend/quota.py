@@ -0,0 +1,237 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+from dotenv import load_dotenv
+from googleapiclient.errors import HttpError
+from state_store import get_state_store
+from metrics import YOUTUBE_REQUEST_SECONDS, UPSTREAM_ERRORS, UPSTREAM_RETRIES
+
+# Load .env from root directory (parent of backend)
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# YouTube Data API budget and pacing
+YOUTUBE_DAILY_QUOTA = int(os.getenv('YOUTUBE_DAILY_QUOTA', '10000'))
+YOUTUBE_MAX_QPS = float(os.getenv('YOUTUBE_MAX_QPS', '10'))
+YOUTUBE_MIN_QPS = 0.5
+YOUTUBE_MAX_RETRIES = int(os.getenv('YOUTUBE_MAX_RETRIES', '5'))
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 32.0
+
+# Unit cost of each YouTube Data API method we call
+METHOD_COSTS = {
+    'list': 1,
+    'insert': 50,
+    'update': 50,
+    'delete': 50,
+}
+
+# Daily quota resets at midnight Pacific time
+QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+QUOTA_REASONS = {'quotaExceeded', 'dailyLimitExceeded'}
+
+
+class QuotaExhausted(Exception):
+    """The daily YouTube Data API budget is used up; the transfer can be resumed after reset"""
+
+    def __init__(self, resets_at):
+        self.resets_at = resets_at
+        super().__init__(
+            f"YouTube API daily quota exhausted. Resume the transfer after "
+            f"{datetime.fromtimestamp(resets_at, QUOTA_TIMEZONE):%Y-%m-%d %H:%M %Z}"
+        )
+
+
+def method_cost(method_id):
+    """Unit cost of a method id such as 'youtube.playlistItems.insert'"""
+    return METHOD_COSTS.get((method_id or '').rsplit('.', 1)[-1], 1)
+
+
+def error_reason(error):
+    """Return the reason string of a Google API HttpError, e.g. 'quotaExceeded'"""
+    try:
+        return json.loads(error.content)['error']['errors'][0]['reason']
+    except Exception:
+        return None
+
+
+def _next_reset():
+    now = datetime.now(QUOTA_TIMEZONE)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight.timestamp()
+
+
+class QuotaLimiter:
+    """
+    Token-bucket rate limiter and daily unit ledger for YouTube Data API calls.
+
+    The bucket rate backs off multiplicatively when Google answers 429 or a
+    rate-limit 403 and recovers additively on success. Units are charged for
+    every attempt, since Google bills failed calls too. The ledger is kept in
+    the shared state store so every worker draws on the same daily budget;
+    the rate limit is per process.
+    """
+
+    def __init__(self, daily_quota=YOUTUBE_DAILY_QUOTA, max_qps=YOUTUBE_MAX_QPS, ledger=None):
+        self.daily_quota = daily_quota
+        self.max_qps = max_qps
+        self.rate = max_qps
+        self.tokens = max_qps
+        self.resets_at = _next_reset()
+        self.exhausted = False
+        self._ledger = ledger
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _roll_day(self):
+        if time.time() >= self.resets_at:
+            self.exhausted = False
+            self.resets_at = _next_reset()
+
+    def _ledger_key(self):
+        return f'youtube_quota:{int(self.resets_at)}'
+
+    def _charge(self, units):
+        # Returns False (and charges nothing) if the units don't fit in today's budget
+        ledger = self._ledger or get_state_store()
+        ttl = self.resets_at - time.time() + 3600
+        if ledger.incr(self._ledger_key(), units, ttl) > self.daily_quota:
+            ledger.incr(self._ledger_key(), -units, ttl)
+            return False
+        return True
+
+    @property
+    def used(self):
+        ledger = self._ledger or get_state_store()
+        return int(ledger.get(self._ledger_key()) or 0)
+
+    def affordable(self, units):
+        """How many calls costing units each today's remaining budget still covers"""
+        with self._lock:
+            self._roll_day()
+            if self.exhausted:
+                return 0
+        return max(0, self.daily_quota - self.used) // units
+
+    def reserve(self, units, usage=None, min_units=None):
+        """
+        Wait for a rate token and charge units, raising QuotaExhausted if over budget.
+
+        The budget is only marked exhausted for this process once less than
+        min_units (default units) is left, so refusing a large batch doesn't
+        also refuse the single calls that still fit.
+        """
+        while True:
+            with self._lock:
+                self._roll_day()
+                if self.exhausted:
+                    raise QuotaExhausted(self.resets_at)
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+        if not self._charge(units):
+            if self.affordable(min_units or units) == 0:
+                with self._lock:
+                    self.exhausted = True
+            raise QuotaExhausted(self.resets_at)
+        if usage is not None:
+            usage.add_quota(units)
+
+    def _slow_down(self):
+        with self._lock:
+            self.rate = max(YOUTUBE_MIN_QPS, self.rate / 2)
+
+    def _speed_up(self):
+        with self._lock:
+            self.rate = min(self.max_qps, self.rate + 0.1)
+
+    def observe(self, error):
+        """Inspect a failed call; mark the budget exhausted on quota errors"""
+        if isinstance(error, HttpError) and error.resp.status == 403 and error_reason(error) in QUOTA_REASONS:
+            with self._lock:
+                self.exhausted = True
+            raise QuotaExhausted(self.resets_at)
+
+    def call(self, fn, units, usage=None, retries=YOUTUBE_MAX_RETRIES, method='unknown', min_units=None):
+        """
+        Run fn() under the limiter, retrying rate-limit and server errors with
+        exponential backoff and full jitter. method labels the latency metrics;
+        min_units is passed on to reserve.
+        """
+        for attempt in range(retries + 1):
+            self.reserve(units, usage, min_units)
+            started = time.perf_counter()
+            try:
+                result = fn()
+            except HttpError as e:
+                YOUTUBE_REQUEST_SECONDS.observe(time.perf_counter() - started, method)
+                status = e.resp.status
+                UPSTREAM_ERRORS.inc('youtube', str(status))
+                self.observe(e)
+                throttled = status == 429 or (status == 403 and error_reason(e) in RATE_LIMIT_REASONS)
+                if throttled:
+                    self._slow_down()
+                if attempt == retries or not (throttled or status >= 500):
+                    raise
+                UPSTREAM_RETRIES.inc('youtube', str(status))
+                time.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+                continue
+            YOUTUBE_REQUEST_SECONDS.observe(time.perf_counter() - started, method)
+            self._speed_up()
+            return result
+
+    def stats(self):
+        used = self.used
+        with self._lock:
+            self._roll_day()
+            return {
+                'units_used': used,
+                'daily_quota': self.daily_quota,
+                'exhausted': self.exhausted,
+                'resets_at': self.resets_at,
+                'rate_qps': round(self.rate, 2)
+            }
+
+
+youtube_quota = QuotaLimiter()
+
+
+@functools.cache
+def _metered_request_class():
+    # Defined on first use so googleapiclient.http (slow to import) loads with the first YouTube client
+    from googleapiclient.http import HttpRequest
+
+    class MeteredHttpRequest(HttpRequest):
+        """HttpRequest whose execute() goes through the process-wide QuotaLimiter"""
+
+        usage = None
+
+        def execute(self, http=None, num_retries=0):
+            return youtube_quota.call(
+                lambda: super(MeteredHttpRequest, self).execute(http=http, num_retries=num_retries),
+                method_cost(self.methodId), self.usage, method=(self.methodId or 'unknown').replace('youtube.', '', 1)
+            )
+
+    return MeteredHttpRequest
+
+
+def metered_request_builder(usage=None):
+    """requestBuilder for googleapiclient.discovery.build that meters every call"""
+    def builder(*args, **kwargs):
+        request = _metered_request_class()(*args, **kwargs)
+        request.usage = usage
+        return request
+    return builder
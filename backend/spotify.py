@@ -1,11 +1,131 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from dotenv import load_dotenv
+from metrics import SPOTIFY_PAGE_SECONDS, UPSTREAM_ERRORS
+from tracing import NO_TRACE
+
+# Load .env from root directory (parent of backend)
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# Maximum Spotify pages fetched concurrently per listing
+SPOTIFY_PAGE_WORKERS = int(os.getenv('SPOTIFY_PAGE_WORKERS', '4'))
+
+
+class Track:
+    """
+    A Spotify track, reduced to what a transfer needs.
+    
+    Slotted rather than a dict: a 10k track playlist is held by every
+    transfer of it, so the per-track overhead matters.
+    """
+    
+    __slots__ = ('id', 'name', 'artist', 'isrc', 'duration_ms')
+    
+    def __init__(self, id, name, artist, isrc=None, duration_ms=None):
+        self.id = id
+        self.name = name
+        self.artist = artist  # Primary artist only
+        self.isrc = isrc
+        self.duration_ms = duration_ms
+    
+    @classmethod
+    def from_spotify(cls, track):
+        """Build from a Spotify track object"""
+        artists = track.get('artists') or []
+        return cls(
+            track.get('id'),
+            track['name'],
+            artists[0]['name'] if artists else '',
+            (track.get('external_ids') or {}).get('isrc'),
+            track.get('duration_ms')
+        )
+    
+    @property
+    def label(self):
+        """'Name Artist': the search query, and how the track is shown to the user"""
+        return f"{self.name} {self.artist}"
+    
+    def to_list(self):
+        """Compact JSON form, e.g. for a stored preview"""
+        return [getattr(self, field) for field in self.__slots__]
+    
+    @classmethod
+    def from_list(cls, values):
+        return cls(*values)
+    
+    def __repr__(self):
+        return f"Track({self.id!r}, {self.label!r})"
+
+
+def iter_pages(fetch_page, limit, max_workers=None, trace=None):
+    """
+    Yield every page of a Spotify offset-paged endpoint, in order.
+    
+    The first page is fetched alone to learn `total`; the remaining offsets
+    are then fetched concurrently. Only max_workers pages are requested ahead
+    of the consumer, so a slow consumer still bounds memory.
+    
+    Args:
+        fetch_page: Callable taking an offset and returning a Spotify paging object
+        limit: Page size passed to the endpoint
+        max_workers: Maximum concurrent page fetches (defaults to SPOTIFY_PAGE_WORKERS)
+        trace: Optional Trace given a span per page
+    """
+    fetch_page = _timed(fetch_page, trace or NO_TRACE)
+    first = fetch_page(0)
+    yield first
+    
+    offsets = iter(range(limit, first['total'], limit))
+    workers = max(1, max_workers or SPOTIFY_PAGE_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='spotify-page') as executor:
+        pending = deque(executor.submit(fetch_page, offset) for _, offset in zip(range(workers), offsets))
+        while pending:
+            page = pending.popleft().result()
+            offset = next(offsets, None)
+            if offset is not None:
+                pending.append(executor.submit(fetch_page, offset))
+            yield page
+
+
+def _timed(fetch_page, trace):
+    """Wrap a page fetch to record its latency (metric and trace span) and any Spotify error status"""
+    def fetch(offset):
+        started = time.perf_counter()
+        with trace.span('spotify_page', offset=offset) as span:
+            try:
+                page = fetch_page(offset)
+            except Exception as e:
+                # spotipy.SpotifyException carries the HTTP status; other errors are transport failures
+                UPSTREAM_ERRORS.inc('spotify', str(getattr(e, 'http_status', None) or 'error'))
+                raise
+            finally:
+                SPOTIFY_PAGE_SECONDS.observe(time.perf_counter() - started)
+            span['items'] = len(page.get('items', []))
+            return page
+    return fetch
+
+
 # ===== OAUTH-BASED FUNCTIONS =====
 
+# Partial responses: only the parts of each Spotify object we read.
+# (/me/playlists takes no fields parameter, so playlist listings come whole.)
+PLAYLIST_INFO_FIELDS = 'name,snapshot_id,tracks.total'
+PLAYLIST_TRACKS_FIELDS = 'total,items(track(id,name,artists(name),external_ids(isrc),duration_ms,is_local,restrictions))'
+
+# Fields of each playlist returned by get_user_playlists
+PLAYLIST_FIELDS = ('id', 'name', 'description', 'tracks_total', 'image_url', 'owner', 'public', 'snapshot_id')
+
+
 def get_user_playlists(sp_client):
     """Get all playlists for the authenticated user using Spotipy client"""
     playlists = []
-    results = sp_client.current_user_playlists(limit=50)
+    pages = iter_pages(lambda offset: sp_client.current_user_playlists(limit=50, offset=offset), 50)
     
-    while results:
+    for results in pages:
         for item in results['items']:
             playlists.append({
                 'id': item['id'],
@@ -14,50 +134,41 @@ def get_user_playlists(sp_client):
                 'tracks_total': item['tracks']['total'],
                 'image_url': item['images'][0]['url'] if item['images'] else None,
                 'owner': item['owner']['display_name'],
-                'public': item.get('public', False)
+                'public': item.get('public', False),
+                'snapshot_id': item.get('snapshot_id')
             })
-        
-        # Get next page if available
-        if results['next']:
-            results = sp_client.next(results)
-        else:
-            results = None
     
     return playlists
 
 
-def get_playlist_tracks_oauth(sp_client, playlist_id):
-    """Get tracks from a playlist using OAuth authenticated Spotipy client"""
-    tracks = []
-    playlist_name = ""
-    
-    # Get playlist details
-    playlist = sp_client.playlist(playlist_id)
-    playlist_name = playlist['name']
-    
-    # Get all tracks
-    results = sp_client.playlist_tracks(playlist_id, limit=100)
+def get_playlist_info(sp_client, playlist_id):
+    """Get a playlist's name, track count and snapshot_id (which changes whenever its tracks do)"""
+    playlist = sp_client.playlist(playlist_id, fields=PLAYLIST_INFO_FIELDS)
+    return {
+        'name': playlist['name'],
+        'tracks_total': playlist['tracks']['total'],
+        'snapshot_id': playlist.get('snapshot_id')
+    }
+
+
+def iter_playlist_tracks(sp_client, playlist_id, trace=None):
+    """Yield a playlist's tracks as Tracks; later pages are fetched concurrently, a few pages ahead"""
+    pages = iter_pages(
+        lambda offset: sp_client.playlist_tracks(playlist_id, fields=PLAYLIST_TRACKS_FIELDS, limit=100, offset=offset),
+        100, trace=trace
+    )
     
-    while results:
+    for results in pages:
         for item in results['items']:
             track = item.get('track')
             if not track or track.get('is_local') or track.get('restrictions'):
                 continue
             
-            tracks.append({
-                "name": track["name"],
-                "artists": [artist["name"] for artist in track["artists"]],
-                "album": track["album"]["name"],
-            })
-        
-        # Get next page if available
-        if results['next']:
-            results = sp_client.next(results)
-        else:
-            results = None
-    
-    return tracks, playlist_name
-    
-    
+            yield Track.from_spotify(track)
 
 
+def get_playlist_tracks_oauth(sp_client, playlist_id):
+    """Get a playlist's Tracks and its name using OAuth authenticated Spotipy client"""
+    playlist_name = get_playlist_info(sp_client, playlist_id)['name']
+    tracks = list(iter_playlist_tracks(sp_client, playlist_id))
+    return tracks, playlist_name
@@ -0,0 +1,282 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+from flask_session.base import ServerSideSession, ServerSideSessionInterface
+
+# Load .env from root directory (parent of backend)
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# Where OAuth states, sessions, job records and the YouTube quota ledger live:
+# memory, sqlite or redis. memory only works with a single worker process;
+# sqlite is shared by the workers of one host; redis is shared by every
+# container pointing at it.
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'sqlite')
+STATE_STORE_PATH = os.getenv('STATE_STORE_PATH', str(Path(__file__).parent / 'data' / 'state.db'))
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+# How many writes between sweeps of expired entries (memory and sqlite)
+SWEEP_INTERVAL = 200
+
+
+class MemoryStateStore:
+    """Process-local store with per-key expiry"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def _sweep(self, now):
+        self._writes += 1
+        if self._writes % SWEEP_INTERVAL == 0:
+            for key in [k for k, (_, expires_at) in self._data.items() if expires_at <= now]:
+                del self._data[key]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key, time.time())
+            return entry[0] if entry else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._data[key] = (value, now + ttl)
+            self._sweep(now)
+
+    def add(self, key, value, ttl):
+        """Set key only if it is not already set; returns True if it was set"""
+        now = time.time()
+        with self._lock:
+            if self._live(key, now):
+                return False
+            self._data[key] = (value, now + ttl)
+            self._sweep(now)
+            return True
+
+    def incr(self, key, amount, ttl):
+        """Add amount to an integer counter, creating it with ttl; returns the new value"""
+        now = time.time()
+        with self._lock:
+            entry = self._live(key, now)
+            value = (int(entry[0]) if entry else 0) + amount
+            self._data[key] = (str(value), entry[1] if entry else now + ttl)
+            return value
+
+    def pop(self, key):
+        """Remove key and return its value (None if unset or expired)"""
+        with self._lock:
+            entry = self._live(key, time.time())
+            self._data.pop(key, None)
+            return entry[0] if entry else None
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SQLiteStateStore:
+    """Store in a SQLite file, shared by every worker process on the host"""
+
+    def __init__(self, path=STATE_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS state_expires_at ON state (expires_at)')
+        conn.commit()
+
+    def _conn(self):
+        # SQLite connections can't be shared between threads or across fork,
+        # so keep one per thread and reopen in a forked worker
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _sweep(self, conn, now):
+        with self._lock:
+            self._writes += 1
+            sweep = self._writes % SWEEP_INTERVAL == 0
+        if sweep:
+            conn.execute('DELETE FROM state WHERE expires_at <= ?', (now,))
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value FROM state WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            'INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, value, now + ttl)
+        )
+        self._sweep(conn, now)
+
+    def add(self, key, value, ttl):
+        """Set key only if it is not already set; returns True if it was set"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM state WHERE key = ? AND expires_at <= ?', (key, now))
+            added = conn.execute(
+                'INSERT OR IGNORE INTO state (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, value, now + ttl)
+            ).rowcount == 1
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return added
+
+    def incr(self, key, amount, ttl):
+        """Add amount to an integer counter, creating it with ttl; returns the new value"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT value, expires_at FROM state WHERE key = ? AND expires_at > ?', (key, now)
+            ).fetchone()
+            value = (int(row[0]) if row else 0) + amount
+            conn.execute(
+                'INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, str(value), row[1] if row else now + ttl)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+    def pop(self, key):
+        """Remove key and return its value (None if unset or expired)"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT value FROM state WHERE key = ? AND expires_at > ?', (key, time.time())
+            ).fetchone()
+            conn.execute('DELETE FROM state WHERE key = ?', (key,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return row[0] if row else None
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM state WHERE key = ?', (key,))
+
+
+class RedisStateStore:
+    """Store in Redis, shared by every worker and container; Redis handles expiry"""
+
+    def __init__(self, url=REDIS_URL):
+        # Optional dependency: only needed with STATE_BACKEND=redis
+        import redis
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=max(1, int(ttl)))
+
+    def add(self, key, value, ttl):
+        """Set key only if it is not already set; returns True if it was set"""
+        return bool(self.client.set(key, value, ex=max(1, int(ttl)), nx=True))
+
+    def incr(self, key, amount, ttl):
+        """Add amount to an integer counter, creating it with ttl; returns the new value"""
+        value = self.client.incrby(key, amount)
+        if value == amount:
+            self.client.expire(key, max(1, int(ttl)))
+        return value
+
+    def pop(self, key):
+        """Remove key and return its value (None if unset or expired)"""
+        pipe = self.client.pipeline()
+        pipe.get(key)
+        pipe.delete(key)
+        value, _ = pipe.execute()
+        return value
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+STATE_BACKENDS = {
+    'memory': MemoryStateStore,
+    'sqlite': SQLiteStateStore,
+    'redis': RedisStateStore,
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_state_store():
+    """Return the process-wide state store selected by STATE_BACKEND"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if STATE_BACKEND not in STATE_BACKENDS:
+                raise ValueError(f"Unknown STATE_BACKEND '{STATE_BACKEND}', use one of {', '.join(STATE_BACKENDS)}")
+            _store = STATE_BACKENDS[STATE_BACKEND]()
+        return _store
+
+
+class StateStoreSession(ServerSideSession):
+    pass
+
+
+class StateStoreSessionInterface(ServerSideSessionInterface):
+    """Flask-Session interface keeping server-side sessions in the state store"""
+
+    session_class = StateStoreSession
+    ttl = True
+
+    def __init__(self, app, store=None):
+        self.store = store or get_state_store()
+        super().__init__(
+            app,
+            key_prefix=app.config.get('SESSION_KEY_PREFIX', 'session:'),
+            permanent=app.config.get('SESSION_PERMANENT', True),
+            serialization_format='json'
+        )
+
+    def _retrieve_session_data(self, store_id):
+        data = self.store.get(store_id)
+        return self.serializer.decode(data.encode()) if data else None
+
+    def _delete_session(self, store_id):
+        self.store.delete(store_id)
+
+    def _upsert_session(self, session_lifetime, session, store_id):
+        self.store.set(store_id, self.serializer.encode(session).decode(), session_lifetime.total_seconds())
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Backend modules are imported flat, as the app does; keep test state away
+# from the real data directory and quota ledger before any of them loads
+sys.path.insert(0, str(Path(__file__).parent.parent))
+_data_dir = tempfile.mkdtemp(prefix='stoy-test-')
+os.environ.setdefault('STATE_BACKEND', 'memory')
+os.environ.setdefault('MATCH_CACHE_PATH', os.path.join(_data_dir, 'match_cache.db'))
+os.environ.setdefault('MANIFEST_PATH', os.path.join(_data_dir, 'manifests.db'))
+os.environ.setdefault('YOUTUBE_DAILY_QUOTA', str(10 ** 12))
@@ -0,0 +1,142 @@
+"""
+Every Spotify and YouTube Data API call asks for a partial response. These
+tests pin the exact fields and parts requested, so widening a projection
+(or dropping one) is a deliberate change rather than an accident.
+"""
+from playlist_index import UserPlaylistIndex
+from spotify import get_playlist_info, iter_playlist_tracks
+from ytm import create_playlist, get_channel_id, insert_playlist_items
+
+
+class RecordingSpotify:
+    """Stands in for a spotipy client, recording the arguments of each call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def playlist(self, playlist_id, **kwargs):
+        self.calls.append(('playlist', kwargs))
+        return {'name': 'Mix', 'snapshot_id': 'snap', 'tracks': {'total': 1}}
+
+    def playlist_tracks(self, playlist_id, **kwargs):
+        self.calls.append(('playlist_tracks', kwargs))
+        track = {'id': 't1', 'name': 'Song', 'artists': [{'name': 'Artist'}], 'duration_ms': 1000}
+        return {'total': 1, 'items': [{'track': track}]}
+
+
+class _Request:
+    def __init__(self, calls, method, params, response):
+        calls.append((method, params))
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+class _Resource:
+    def __init__(self, calls, name, list_response=None):
+        self.calls = calls
+        self.name = name
+        self.list_response = list_response or {}
+
+    def list(self, **params):
+        return _Request(self.calls, f'{self.name}.list', params, self.list_response)
+
+    def list_next(self, request, response):
+        return None
+
+    def insert(self, **params):
+        return _Request(self.calls, f'{self.name}.insert', params, {'id': 'new'})
+
+
+class _Batch:
+    def __init__(self, callback):
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            self.callback(request_id, request.execute(), None)
+
+
+class RecordingYouTube:
+    """Stands in for a YouTube Data API client, recording the parameters of each request built"""
+
+    def __init__(self):
+        self.calls = []
+
+    def channels(self):
+        return _Resource(self.calls, 'channels', {'items': [{'id': 'UC1'}]})
+
+    def playlists(self):
+        return _Resource(self.calls, 'playlists', {'items': [{'id': 'PL1', 'snippet': {'title': 'Mix'}}]})
+
+    def playlistItems(self):
+        return _Resource(self.calls, 'playlistItems', {'items': [{'contentDetails': {'videoId': 'v1'}}]})
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(callback)
+
+    def params(self, method):
+        return [params for name, params in self.calls if name == method]
+
+
+def test_spotify_playlist_info_fields():
+    sp = RecordingSpotify()
+    get_playlist_info(sp, 'p1')
+    assert sp.calls == [('playlist', {'fields': 'name,snapshot_id,tracks.total'})]
+
+
+def test_spotify_playlist_tracks_fields():
+    sp = RecordingSpotify()
+    list(iter_playlist_tracks(sp, 'p1'))
+    (method, kwargs), = sp.calls
+    assert method == 'playlist_tracks'
+    assert kwargs['fields'] == (
+        'total,items(track(id,name,artists(name),external_ids(isrc),duration_ms,is_local,restrictions))'
+    )
+
+
+def test_youtube_playlists_list_projection():
+    youtube = RecordingYouTube()
+    assert UserPlaylistIndex().find_playlist(youtube, 'Mix') == 'PL1'
+    params, = youtube.params('playlists.list')
+    assert params['part'] == 'snippet'
+    assert params['fields'] == 'etag,nextPageToken,pageInfo/totalResults,items(id,snippet/title)'
+
+
+def test_youtube_playlist_items_list_projection():
+    youtube = RecordingYouTube()
+    assert UserPlaylistIndex().playlist_contents(youtube, 'PL1') == ({'v1'}, 1)
+    params, = youtube.params('playlistItems.list')
+    assert params['part'] == 'contentDetails'
+    assert params['fields'] == 'etag,nextPageToken,pageInfo/totalResults,items/contentDetails/videoId'
+
+
+def test_youtube_playlist_items_insert_projection():
+    youtube = RecordingYouTube()
+    # Batched, then one at a time once positions are off
+    insert_playlist_items(youtube, 'PL1', ['v1', 'v2'])
+    insert_playlist_items(youtube, 'PL1', ['v3'], positioned=False)
+    inserts = youtube.params('playlistItems.insert')
+    assert len(inserts) == 3
+    for params in inserts:
+        assert params['part'] == 'snippet'
+        assert params['fields'] == 'id'
+
+
+def test_youtube_playlists_insert_projection():
+    youtube = RecordingYouTube()
+    assert create_playlist(youtube, 'Mix') == 'new'
+    params, = youtube.params('playlists.insert')
+    assert params['part'] == 'snippet,status'
+    assert params['fields'] == 'id'
+
+
+def test_youtube_channels_list_projection():
+    youtube = RecordingYouTube()
+    assert get_channel_id(youtube) == 'UC1'
+    assert youtube.params('channels.list') == [{'mine': True, 'part': 'id', 'fields': 'items/id'}]
@@ -0,0 +1,184 @@
+import heapq
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load .env from root directory (parent of backend)
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+# One JSON lines file per transfer job; only the newest TRACE_RETAIN are kept
+TRACE_DIR = os.getenv('TRACE_DIR', str(Path(__file__).parent / 'data' / 'traces'))
+TRACE_RETAIN = int(os.getenv('TRACE_RETAIN', '200'))
+# Spans recorded per job attempt; later spans are only counted
+TRACE_MAX_SPANS = int(os.getenv('TRACE_MAX_SPANS', '50000'))
+# Spans held in memory before a span write goes to disk itself (normally the job sync thread flushes)
+TRACE_BUFFER = 2000
+# Slowest spans listed in each attempt's summary record
+TRACE_SLOWEST = 10
+
+# Job ids come from secrets.token_urlsafe
+_JOB_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def trace_path(job_id):
+    """Path of a job's trace file, or None if job_id is not a valid job id"""
+    if not _JOB_ID.match(job_id or ''):
+        return None
+    return Path(TRACE_DIR) / f'{job_id}.jsonl'
+
+
+def list_traces():
+    """Newest first: [{job_id, bytes, modified}] for every retained trace"""
+    traces = []
+    for path in Path(TRACE_DIR).glob('*.jsonl'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue  # Dropped from the ring meanwhile
+        traces.append({'job_id': path.stem, 'bytes': stat.st_size, 'modified': stat.st_mtime})
+    return sorted(traces, key=lambda t: t['modified'], reverse=True)
+
+
+def _trim_ring(keep):
+    for trace in list_traces()[keep:]:
+        try:
+            (Path(TRACE_DIR) / f"{trace['job_id']}.jsonl").unlink()
+        except FileNotFoundError:
+            pass
+
+
+class Trace:
+    """
+    Timed spans of one transfer job attempt, appended as JSON lines to the
+    job's trace file.
+
+    Recording a span only appends to an in-memory buffer; the job sync thread
+    calls flush(), so the transfer itself rarely touches the disk. close()
+    writes a summary record with per-span totals and the slowest spans.
+    """
+
+    def __init__(self, job_id, attempt=0):
+        self.job_id = job_id
+        self.attempt = attempt
+        self.path = trace_path(job_id)
+        self.spans = 0
+        self.dropped = 0
+        self.totals = {}  # span name -> [count, total seconds, max seconds]
+        self.slowest = []  # min-heap of (seconds, seq, record)
+        self._buffer = []
+        self._lock = threading.Lock()
+        try:
+            Path(TRACE_DIR).mkdir(parents=True, exist_ok=True)
+            # Make room for this trace (resumed jobs append to their existing file)
+            if not self.path.exists():
+                _trim_ring(TRACE_RETAIN - 1)
+        except OSError as e:
+            print(f"  ⚠ Could not prepare trace directory {TRACE_DIR}: {e}")
+        self._write([{'span': 'attempt', 'job_id': job_id, 'attempt': attempt, 'start': time.time()}])
+
+    def record(self, name, seconds, start=None, **attrs):
+        """Record a finished span that took seconds"""
+        record = {
+            'span': name,
+            'start': round(start if start is not None else time.time() - seconds, 6),
+            'ms': round(seconds * 1000, 3),
+            **attrs
+        }
+        flush = None
+        with self._lock:
+            totals = self.totals.get(name)
+            if totals is None:
+                totals = self.totals[name] = [0, 0.0, 0.0]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+            if len(self.slowest) < TRACE_SLOWEST:
+                heapq.heappush(self.slowest, (seconds, self.spans + self.dropped, record))
+            elif seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (seconds, self.spans + self.dropped, record))
+            if self.spans >= TRACE_MAX_SPANS:
+                self.dropped += 1
+                return
+            self.spans += 1
+            self._buffer.append(record)
+            if len(self._buffer) >= TRACE_BUFFER:
+                flush, self._buffer = self._buffer, []
+        if flush:
+            self._write(flush)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        Time the with block as a span. The yielded dict holds the span's
+        attributes and can be added to inside the block; an exception is
+        recorded as the span's error and re-raised.
+        """
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            yield attrs
+        except Exception as e:
+            attrs['error'] = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            self.record(name, time.perf_counter() - started, start=start, **attrs)
+
+    def flush(self):
+        """Write buffered spans to the trace file"""
+        with self._lock:
+            records, self._buffer = self._buffer, []
+        if records:
+            self._write(records)
+
+    def _write(self, records):
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(record, default=str) + '\n' for record in records))
+        except OSError as e:
+            # Tracing must never break a transfer
+            print(f"  ⚠ Could not write trace for job {self.job_id}: {e}")
+
+    def close(self, **attrs):
+        """Flush the remaining spans and append the summary record, with attrs such as the final status"""
+        self.flush()
+        with self._lock:
+            summary = {
+                'span': 'summary',
+                'job_id': self.job_id,
+                'attempt': self.attempt,
+                **attrs,
+                'spans': self.spans,
+                'dropped': self.dropped,
+                'totals': {
+                    name: {'count': count, 'total_ms': round(total * 1000, 3), 'max_ms': round(peak * 1000, 3)}
+                    for name, (count, total, peak) in self.totals.items()
+                },
+                'slowest': [record for _, _, record in sorted(self.slowest, key=lambda s: s[0], reverse=True)]
+            }
+        self._write([summary])
+
+
+class NullTrace:
+    """Trace that records nothing, used outside transfer jobs"""
+
+    def record(self, name, seconds, start=None, **attrs):
+        pass
+
+    @contextmanager
+    def span(self, name, **attrs):
+        yield attrs
+
+    def flush(self):
+        pass
+
+    def close(self, **attrs):
+        pass
+
+
+NO_TRACE = NullTrace()
@@ -0,0 +1,121 @@
+from googleapiclient.errors import HttpError
+from spotify import get_playlist_info, iter_playlist_tracks
+from ytm import create_ytm_playlist_oauth, build_youtube_client
+from playlist_index import get_playlist_index, user_key
+from manifest import get_manifest_store
+
+
+def sync_playlist(sp_client, credentials, playlist_id, progress=None, info=None,
+                  youtube=None, ytmusic=None, memo=None, prune=False, trace=None, tracks=None):
+    """
+    Transfer a Spotify playlist to YouTube Music, or bring an earlier transfer up to date.
+    
+    A manifest per (YouTube channel, Spotify playlist) remembers the last synced
+    snapshot_id, the videoId found for each Spotify track and the target
+    YouTube playlist. If the snapshot is unchanged nothing is fetched or
+    searched; otherwise only tracks not already matched are searched and
+    inserted. The manifest is saved after every inserted batch, and search
+    results live in the match cache, so a transfer that is cut off picks up
+    where it stopped when run again. With prune, songs we added for tracks
+    since removed on Spotify are deleted from the YouTube playlist.
+    
+    Args:
+        sp_client: Authenticated Spotipy client
+        credentials: Google OAuth2 credentials dict
+        playlist_id: Spotify playlist id
+        progress: Optional TransferJob updated as the transfer runs
+        info: Optional playlist info from get_playlist_info / get_user_playlists
+        youtube, ytmusic, memo: Optional shared clients and search memo (see create_ytm_playlist_oauth)
+        prune: Remove songs for tracks deleted from the Spotify playlist
+        trace: Optional Trace given spans for Spotify pages, searches and inserts
+        tracks: Optional list of spotify.Track to sync instead of reading the
+            playlist from Spotify (e.g. a committed preview's); sp_client is
+            then unused if info is given
+    
+    Returns:
+        Dictionary with playlist_name, missed_tracks, unchanged and removed
+    """
+    if info is None:
+        info = get_playlist_info(sp_client, playlist_id)
+    
+    store = get_manifest_store()
+    manifest = store.load(user_key(credentials), playlist_id)
+    if youtube is None:
+        youtube = build_youtube_client(credentials, usage=progress)
+    playlist_index = get_playlist_index(credentials)
+    
+    if manifest.youtube_playlist_id and not playlist_index.has_playlist(youtube, manifest.youtube_playlist_id):
+        # The YouTube playlist was deleted since the last sync: start over
+        print(f"YouTube playlist for '{info['name']}' no longer exists, transferring from scratch")
+        manifest.reset()
+    elif manifest.snapshot_id and manifest.snapshot_id == info['snapshot_id']:
+        print(f"✓ '{info['name']}' is unchanged since the last transfer, nothing to do")
+        return {
+            "playlist_name": info['name'],
+            "missed_tracks": manifest.missed_tracks(),
+            "unchanged": True,
+            "removed": 0
+        }
+    
+    current_ids = set()
+    
+    def new_tracks():
+        source = tracks if tracks is not None else iter_playlist_tracks(sp_client, playlist_id, trace=trace)
+        for track in source:
+            current_ids.add(track.id)
+            if manifest.is_matched(track):
+                if progress:
+                    progress.track_skipped(track=track.label, video_id=manifest.tracks[track.id]['video_id'])
+                continue
+            yield track
+    
+    def checkpoint():
+        store.save(manifest)
+        if progress:
+            progress.checkpoint()
+    
+    try:
+        missed_tracks, failed_count = create_ytm_playlist_oauth(
+            credentials, new_tracks(), info['name'], progress=progress,
+            youtube=youtube, ytmusic=ytmusic, memo=memo, manifest=manifest,
+            checkpoint=checkpoint, trace=trace
+        )
+    finally:
+        # Keep what was matched and inserted even if the transfer stopped early
+        store.save(manifest)
+    
+    removed = prune_removed_tracks(youtube, manifest, current_ids) if prune else 0
+    if removed:
+        playlist_index.invalidate(manifest.youtube_playlist_id)
+    
+    # Only a completed sync advances the snapshot; tracks whose search or
+    # insert failed keep it back so the next sync tries them again
+    if not missed_tracks.get('search_failed') and not failed_count:
+        manifest.snapshot_id = info['snapshot_id']
+        store.save(manifest)
+    
+    return {
+        "playlist_name": info['name'],
+        "missed_tracks": missed_tracks,
+        "unchanged": False,
+        "removed": removed
+    }
+
+
+def prune_removed_tracks(youtube, manifest, current_ids):
+    """Delete songs we added for tracks no longer in the Spotify playlist; returns the count"""
+    removed = 0
+    for track_id in [tid for tid in manifest.tracks if tid not in current_ids]:
+        entry = manifest.tracks.pop(track_id)
+        # Songs that were already in the playlist before we synced are left alone
+        if not entry.get('item_id'):
+            continue
+        try:
+            youtube.playlistItems().delete(id=entry['item_id']).execute()
+            removed += 1
+        except HttpError as delete_error:
+            print(f"  ⚠ Failed to remove video {entry['video_id']}: {delete_error}")
+            manifest.tracks[track_id] = entry
+    if removed:
+        print(f"Removed {removed} songs no longer in the Spotify playlist")
+    return removed
@@ -1,46 +1,626 @@
-from ytmusicapi import YTMusic
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
+import os
+import random
+import re
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+import queue
+import threading
+import requests
+from dotenv import load_dotenv
+from auth import google_credentials, youtube_credentials
+from clients import get_ytmusic, build_youtube_service
+from match_cache import get_match_cache, query_key
+from playlist_index import get_playlist_index
+from singleflight import SingleFlight
+from quota import youtube_quota, QuotaExhausted, error_reason, method_cost, metered_request_builder
+from metrics import YTM_SEARCH_SECONDS, YTM_SEARCH_HEDGES, UPSTREAM_ERRORS, UPSTREAM_RETRIES
+from tracing import NO_TRACE
 
+# Load .env from root directory (parent of backend)
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
 
-def get_video_ids(ytmusic, tracks):
-    video_ids = []
-    missed_tracks = {
-        "count": 0,
-        "tracks": []
-    }
-    for track in tracks:
+# Maximum number of YouTube Music searches in flight per transfer
+SEARCH_WORKERS = int(os.getenv('YTM_SEARCH_WORKERS', '8'))
+# Maximum number of tracks between the Spotify reader and the insert stage
+PIPELINE_WINDOW = int(os.getenv('TRANSFER_PIPELINE_WINDOW', '256'))
+# playlistItems.insert calls sent per batch HTTP request
+INSERT_BATCH_SIZE = int(os.getenv('YOUTUBE_INSERT_BATCH_SIZE', '50'))
+
+# Seconds one YouTube Music search attempt may take before it is abandoned
+SEARCH_TIMEOUT = float(os.getenv('YTM_SEARCH_TIMEOUT', '10'))
+# Further attempts after a search times out or fails transiently, with jittered backoff
+SEARCH_RETRIES = int(os.getenv('YTM_SEARCH_RETRIES', '2'))
+SEARCH_BACKOFF_BASE = 0.5
+SEARCH_BACKOFF_CAP = 4.0
+# Send a duplicate of a search still running after the recent p95 latency; the first answer wins
+SEARCH_HEDGE = os.getenv('YTM_SEARCH_HEDGE', '1') == '1'
+HEDGE_MIN_DELAY = 0.1
+HEDGE_MIN_SAMPLES = 20
+
+# playlistItems.insert error reasons refusing an explicit position. A playlist that
+# isn't manually sorted refuses every position; an invalid position is usually the
+# knock-on of a failed insert earlier in the same batch, which the in-order retry fixes
+MANUAL_SORT_REASON = 'manualSortRequired'
+POSITION_REASONS = {MANUAL_SORT_REASON, 'invalidPlaylistItemPosition'}
+
+# Identical searches running at the same time, from any transfer, share one call
+inflight_searches = SingleFlight('ytm_search')
+
+
+class SearchTimeout(TimeoutError):
+    """A search attempt outlasted SEARCH_TIMEOUT"""
+
+
+class SearchFailed(Exception):
+    """
+    A search failed. transient is True when every attempt hit a timeout,
+    network error, 429 or 5xx, so trying again later may well succeed.
+    """
+
+    def __init__(self, message, transient=True):
+        super().__init__(message)
+        self.transient = transient
+
+
+class _SearchFailedResult:
+    # Falsy, so code that only tells found from not found treats it as a miss
+    __slots__ = ()
+    
+    def __bool__(self):
+        return False
+    
+    def __repr__(self):
+        return 'SEARCH_FAILED'
+
+
+# Result of match_track (and search_pipeline) for a track whose search kept failing transiently
+SEARCH_FAILED = _SearchFailedResult()
+
+
+class _LatencyWindow:
+    """Latencies of recent successful searches, for the hedge delay"""
+    
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+    
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+    
+    def quantile(self, q):
+        """The q quantile, or None until there are HEDGE_MIN_SAMPLES samples"""
+        with self._lock:
+            values = sorted(self._samples)
+        if len(values) < HEDGE_MIN_SAMPLES:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+_search_latencies = _LatencyWindow()
+_search_pool = None
+_search_pool_lock = threading.Lock()
+
+
+def _get_search_pool():
+    # Search calls run here so the caller can stop waiting for a stalled one; an
+    # abandoned call finishes in the background, bounded by clients.HTTP_TIMEOUT
+    global _search_pool
+    with _search_pool_lock:
+        if _search_pool is None:
+            _search_pool = ThreadPoolExecutor(max_workers=max(32, SEARCH_WORKERS * 8), thread_name_prefix='ytm-call')
+        return _search_pool
+
+
+def _search_once(ytmusic, track):
+    started = time.perf_counter()
+    try:
+        results = ytmusic.search(track.label, filter="songs")
+    finally:
+        elapsed = time.perf_counter() - started
+        YTM_SEARCH_SECONDS.observe(elapsed)
+    _search_latencies.add(elapsed)
+    return results
+
+
+def _bounded_search(ytmusic, track, span=None):
+    """
+    One search attempt, given up after SEARCH_TIMEOUT seconds.
+    
+    With SEARCH_HEDGE, if the call is still running after the recent p95
+    search latency a duplicate is sent and whichever answers first is used.
+    """
+    pool = _get_search_pool()
+    started = time.monotonic()
+    deadline = started + SEARCH_TIMEOUT
+    original = pool.submit(_search_once, ytmusic, track)
+    pending = {original}
+    p95 = _search_latencies.quantile(0.95) if SEARCH_HEDGE else None
+    hedge_at = started + max(HEDGE_MIN_DELAY, p95) if p95 is not None else None
+    error = None
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        done, pending = wait(pending, timeout=min(deadline, hedge_at or deadline) - now, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is not original:
+                    YTM_SEARCH_HEDGES.inc('won')
+                return future.result()
+            error = future.exception()
+        if hedge_at and pending and time.monotonic() >= hedge_at:
+            hedge_at = None
+            YTM_SEARCH_HEDGES.inc('sent')
+            if span is not None:
+                span['hedged'] = True
+            pending.add(pool.submit(_search_once, ytmusic, track))
+    if pending or error is None:
+        raise SearchTimeout(f"YouTube Music search took longer than {SEARCH_TIMEOUT:g}s")
+    raise error
+
+
+def _failure_status(error):
+    """(metric label, worth retrying) for a failed search attempt"""
+    if isinstance(error, SearchTimeout):
+        return 'timeout', True
+    if isinstance(error, requests.RequestException):
+        status = getattr(error.response, 'status_code', None)
+        return str(status or 'network'), status is None or status == 429 or status >= 500
+    # ytmusicapi raises YTMusicServerError("Server returned HTTP 503: ...") for error statuses
+    match = re.search(r'HTTP (\d{3})', str(error)) if type(error).__name__ == 'YTMusicServerError' else None
+    if match:
+        status = int(match.group(1))
+        return str(status), status == 429 or status >= 500
+    return 'error', False
+
+
+def search_track(ytmusic, track, span=None):
+    """
+    Search YouTube Music for a track, returning its videoId or None if there are no results.
+    
+    Attempts are bounded by SEARCH_TIMEOUT and may be hedged (see
+    _bounded_search). Timeouts, network errors, 429s and 5xx responses are
+    retried up to SEARCH_RETRIES times with exponential backoff and full
+    jitter; if no attempt succeeds SearchFailed is raised, so a failure is
+    never mistaken for a track that isn't on YouTube Music. Other errors
+    raise SearchFailed(transient=False) at once.
+    
+    span, if given, is a trace span's attributes; the result count, the rank
+    of the chosen result and the number of attempts are added to it.
+    """
+    for attempt in range(SEARCH_RETRIES + 1):
+        try:
+            results = _bounded_search(ytmusic, track, span)
+            break
+        except Exception as search_error:
+            status, transient = _failure_status(search_error)
+            UPSTREAM_ERRORS.inc('ytmusic', status)
+            if not transient or attempt == SEARCH_RETRIES:
+                raise SearchFailed(str(search_error), transient) from search_error
+            UPSTREAM_RETRIES.inc('ytmusic', status)
+            time.sleep(random.uniform(0, min(SEARCH_BACKOFF_CAP, SEARCH_BACKOFF_BASE * 2 ** attempt)))
+    if span is not None:
+        span['results'] = len(results)
+        span['rank'] = 0 if results else None
+        span['attempts'] = attempt + 1
+    return results[0].get("videoId") if results else None
+
+
+def match_track(ytmusic, track, cache=None, trace=None):
+    """
+    Resolve a track to a videoId, consulting the match cache before searching.
+    
+    Returns None if the track was not found, or SEARCH_FAILED if its search
+    kept failing transiently. A search failing with any other error (a 4xx,
+    a response ytmusicapi can't parse) would fail the same way next time, so
+    the track counts as not found, though the miss is not cached.
+    """
+    return inflight_searches.do(
+        query_key(track), lambda: _match_track(ytmusic, track, cache, trace or NO_TRACE)
+    )
+
+
+def _match_track(ytmusic, track, cache, trace):
+    with trace.span('search', query=track.label) as span:
+        if cache is not None:
+            hit, video_id = cache.get(track)
+            span['cache'] = 'hit' if hit else 'miss'
+            if hit:
+                span['video_id'] = video_id
+                return video_id
+        
         try:
-            search_string = f"{track['name']} {track['artists'][0]}"
-            video_id = ytmusic.search(search_string, filter="songs")[0]["videoId"]
+            video_id = search_track(ytmusic, track, span)
+        except SearchFailed as search_error:
+            # Failures are not cached so the track is retried next time
+            span['error'] = str(search_error)
+            return SEARCH_FAILED if search_error.transient else None
+        
+        span['video_id'] = video_id
+        if cache is not None:
+            cache.set(track, video_id)
+        return video_id
+
+
+def search_pipeline(ytmusic, tracks, cache=None, max_workers=None, window=None, memo=None, trace=None):
+    """
+    Resolve tracks to videoIds while the input is still being read.
+    
+    A reader thread pulls from tracks (which may be a lazy generator of
+    Spotify pages) and hands them to a pool of search threads. Repeats of a
+    track already seen in this input are not searched again; they reuse the
+    first occurrence's result, as do tracks already in `memo`. Results are
+    yielded in input order, and every result but a failed search is recorded
+    in `memo`. At most `window` tracks are buffered between the reader and
+    the consumer, so a slow consumer (the insert stage) throttles both
+    reading and searching.
+    
+    Args:
+        ytmusic: YTMusic instance used for searching
+        tracks: Iterable of spotify.Track
+        cache: Optional MatchCache consulted before each search
+        max_workers: Maximum concurrent searches (defaults to YTM_SEARCH_WORKERS)
+        window: Maximum tracks in flight (defaults to TRANSFER_PIPELINE_WINDOW)
+        memo: Optional dict of query key -> videoId shared across calls
+        trace: Optional Trace given a span per search
+    
+    Yields:
+        (track, video_id) pairs, video_id None if the track was not found or
+        SEARCH_FAILED if its search kept failing
+    """
+    workers = max(1, max_workers or SEARCH_WORKERS)
+    slots = threading.Semaphore(max(workers, window or PIPELINE_WINDOW))
+    todo = queue.Queue()
+    done = queue.Queue()
+    stop = threading.Event()
+    resolved = memo if memo is not None else {}
+    failed = set()  # query keys whose search failed in this input
+    
+    def read():
+        count = 0
+        seen = set()
+        try:
+            for track in tracks:
+                while not slots.acquire(timeout=0.5):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                key = query_key(track)
+                if key in resolved:
+                    done.put(('result', count, track, key, resolved[key]))
+                elif key in seen:
+                    done.put(('duplicate', count, track, key))
+                else:
+                    seen.add(key)
+                    todo.put((count, track, key))
+                count += 1
+            done.put(('end', count))
+        except Exception as read_error:
+            done.put(('error', read_error))
+        finally:
+            for _ in range(workers):
+                todo.put(None)
+    
+    def search():
+        while True:
+            item = todo.get()
+            if item is None or stop.is_set():
+                return
+            index, track, key = item
+            try:
+                done.put(('result', index, track, key, match_track(ytmusic, track, cache, trace)))
+            except Exception as search_error:
+                done.put(('error', search_error))
+    
+    threads = [threading.Thread(target=read, name='ytm-read', daemon=True)]
+    threads += [threading.Thread(target=search, name=f'ytm-search-{i}', daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    
+    # Searches finish out of order; hold results until their turn comes
+    buffered = {}
+    next_index = 0
+    total = None
+    try:
+        while total is None or next_index < total:
+            message = done.get()
+            if message[0] == 'end':
+                total = message[1]
+                continue
+            if message[0] == 'error':
+                raise message[1]
+            _, index, track, key, *result = message
+            buffered[index] = (track, key, result)
+            while next_index in buffered:
+                track, key, result = buffered.pop(next_index)
+                next_index += 1
+                # A duplicate always comes after its first occurrence, which is already resolved
+                video_id = result[0] if result else (SEARCH_FAILED if key in failed else resolved[key])
+                if video_id is SEARCH_FAILED:
+                    failed.add(key)
+                else:
+                    resolved[key] = video_id
+                slots.release()
+                yield track, video_id
+    finally:
+        stop.set()
+
+
+def get_video_ids(ytmusic, tracks, max_workers=None, cache=None, progress=None, trace=None):
+    """
+    Search YouTube Music for every track using a bounded pool of worker threads.
+    
+    Args:
+        ytmusic: YTMusic instance used for searching
+        tracks: Iterable of spotify.Track
+        max_workers: Maximum concurrent searches (defaults to YTM_SEARCH_WORKERS)
+        cache: Optional MatchCache consulted before each search
+        progress: Optional TransferJob notified as each track is resolved; the
+            tracks not found are reported to it one by one rather than collected here
+        trace: Optional Trace given a span per search
+    
+    Returns:
+        video_ids: List of videoIds in the original track order
+        missed_tracks: Dictionary with the count of tracks not found, and of
+            tracks whose search kept failing (search_failed), which are not misses
+    """
+    video_ids = []
+    missed_tracks = {"count": 0, "search_failed": 0}
+    for track, video_id in search_pipeline(ytmusic, tracks, cache=cache, max_workers=max_workers, trace=trace):
+        if video_id is SEARCH_FAILED:
+            missed_tracks["search_failed"] += 1
+            if progress:
+                progress.track_search_failed(track.label)
+        elif video_id:
             video_ids.append(video_id)
-        except:
-            print(f"{track['name']} {track['artists'][0]} not found on YouTube Music")
+            if progress:
+                progress.track_searched(track=track.label, video_id=video_id)
+        else:
             missed_tracks["count"] += 1
-            missed_tracks["tracks"].append(f"{track['name']} {track['artists'][0]}")
+            if progress:
+                progress.track_searched(track.label)
     print(f"Found {len(video_ids)} songs on YouTube Music")
     if len(video_ids) == 0:
-        raise Exception("No songs found on YouTube Music")
+        raise Exception(_nothing_found_message(missed_tracks))
     return video_ids, missed_tracks
 
 
+def _nothing_found_message(missed_tracks):
+    if missed_tracks["search_failed"]:
+        return f"YouTube Music search failed for {missed_tracks['search_failed']} tracks; try again later"
+    return "No songs found on YouTube Music"
+
+
+def playlist_item_request(youtube, playlist_id, video_id, position=None):
+    """Build a playlistItems.insert request, optionally at a fixed position"""
+    snippet = {
+        'playlistId': playlist_id,
+        'resourceId': {
+            'kind': 'youtube#video',
+            'videoId': video_id
+        }
+    }
+    if position is not None:
+        snippet['position'] = position
+    # Only the new item's id is read back
+    return youtube.playlistItems().insert(part='snippet', fields='id', body={'snippet': snippet})
+
+
+def insert_playlist_items(youtube, playlist_id, video_ids, start_position=0, progress=None, on_inserted=None,
+                          trace=None, positioned=True):
+    """
+    Add videos to a playlist using batched playlistItems.insert calls.
+    
+    The server may run the calls inside a batch in any order, so each item is
+    given an explicit position to keep the playlist in track order. Playlists
+    we create are manually sorted, and positions count on from the items
+    already there, so a position is accepted once every song before it is in.
+    Items that fail inside a batch (including those refused because an
+    earlier one failed) are retried one at a time, in order, at their
+    position. A playlist that isn't manually sorted refuses positions: the
+    songs are then sent one at a time in order and appended, for this and
+    later calls, since a batch of appends could land in any order. Every
+    call goes through the quota limiter; QuotaExhausted stops the insert so
+    the transfer can be resumed later.
+    
+    Args:
+        youtube: YouTube Data API v3 client
+        playlist_id: Target playlist id
+        video_ids: videoIds to insert, in playlist order
+        start_position: Number of items already in the playlist
+        progress: Optional TransferJob notified for each inserted or failed song and charged quota units
+        on_inserted: Optional callback(index, item_id) called for each song added,
+            with its index in video_ids and the new playlistItem id
+        trace: Optional Trace given a span per batch and per song sent on its own
+        positioned: Give items explicit positions; pass the previous call's
+            result for the same playlist so a refusal is only paid for once
+    
+    Returns:
+        (added_count, failed_count, positioned), positioned False once the playlist refused positions
+    """
+    trace = trace or NO_TRACE
+    def inserted(index, response):
+        if progress:
+            progress.track_inserted(video_ids[index])
+        if on_inserted:
+            on_inserted(index, (response or {}).get('id'))
+    
+    added_count = 0
+    failed_count = 0
+    cost = method_cost('insert')
+    
+    next_start = 0
+    while next_start < len(video_ids):
+        # Near the end of the day's budget, send only as many inserts as it still
+        # covers; a single call that no longer fits raises QuotaExhausted
+        batch_start = next_start
+        chunk = video_ids[batch_start:batch_start + min(INSERT_BATCH_SIZE, max(1, youtube_quota.affordable(cost)))]
+        next_start += len(chunk)
+        base = start_position + added_count
+        errors = {}
+        responses = {}
+        
+        if positioned:
+            def on_response(request_id, response, exception):
+                if exception is not None:
+                    errors[int(request_id)] = exception
+                else:
+                    responses[int(request_id)] = response
+            
+            batch = youtube.new_batch_http_request(callback=on_response)
+            for i, video_id in enumerate(chunk):
+                batch.add(playlist_item_request(youtube, playlist_id, video_id, base + i), request_id=str(i))
+            with trace.span('insert_batch', position=base, size=len(chunk)) as span:
+                try:
+                    # A batch is billed per sub-request; it is not retried as a whole
+                    # because some of its items may already have been added
+                    youtube_quota.call(batch.execute, cost * len(chunk), progress, retries=0,
+                                       method='playlistItems.insert.batch', min_units=cost)
+                except QuotaExhausted:
+                    if youtube_quota.exhausted:
+                        raise
+                    # Another worker spent the units this batch counted on; size it again
+                    span['resized'] = True
+                    next_start = batch_start
+                    continue
+                except Exception as batch_error:
+                    # The whole batch request failed, so every item needs a retry
+                    span['batch_error'] = str(batch_error)
+                    errors = {i: batch_error for i in range(len(chunk))}
+                span['item_errors'] = len(errors)
+                if any(error_reason(error) == MANUAL_SORT_REASON for error in errors.values()):
+                    positioned = False
+                    span['positions_dropped'] = True
+        else:
+            # Appends in a batch could land in any order, so the songs go one at a time
+            errors = dict.fromkeys(range(len(chunk)))
+        
+        # Send failed and unsent songs individually, in order, so they land in the right slot
+        inserted_before = 0
+        for i, video_id in enumerate(chunk):
+            if i in errors:
+                try:
+                    with trace.span('insert_retry' if errors[i] else 'insert', video_id=video_id) as span:
+                        if errors[i]:
+                            span['batch_error'] = str(errors[i])
+                            youtube_quota.observe(errors[i])
+                        responses[i] = None
+                        if positioned:
+                            try:
+                                responses[i] = playlist_item_request(
+                                    youtube, playlist_id, video_id, base + inserted_before
+                                ).execute()
+                            except QuotaExhausted:
+                                raise
+                            except Exception as retry_error:
+                                if error_reason(retry_error) not in POSITION_REASONS:
+                                    raise
+                                # Every song before this one is in, so positions aren't taken at all
+                                positioned = False
+                                span['positions_dropped'] = True
+                        if responses[i] is None:
+                            span['appended'] = True
+                            responses[i] = playlist_item_request(youtube, playlist_id, video_id).execute()
+                except QuotaExhausted:
+                    # Still report the songs this batch did add before stopping
+                    for j in range(i + 1, len(chunk)):
+                        if j in responses:
+                            inserted(batch_start + j, responses.get(j))
+                    raise
+                except Exception as add_error:
+                    failed_count += 1
+                    if progress:
+                        progress.track_failed(video_id, add_error)
+                    continue
+            inserted_before += 1
+            added_count += 1
+            inserted(batch_start + i, responses.get(i))
+    
+    return added_count, failed_count, positioned
+
+
+def create_playlist(youtube, title):
+    """Create a private YouTube playlist and return its id"""
+    playlist_request = youtube.playlists().insert(
+        part='snippet,status',
+        fields='id',
+        body={
+            'snippet': {
+                'title': title,
+                'description': 'Transferred from Spotify using StoY'
+            },
+            'status': {
+                'privacyStatus': 'private'  # Can be 'public', 'private', or 'unlisted'
+            }
+        }
+    )
+    return playlist_request.execute()['id']
+
+
+def get_channel_id(youtube):
+    """Return the id of the authorized user's YouTube channel, or None if they have none"""
+    response = youtube.channels().list(mine=True, part='id', fields='items/id').execute()
+    items = response.get('items') or []
+    return items[0]['id'] if items else None
+
+
 # ===== OAUTH-BASED FUNCTIONS =====
 
-def create_ytm_playlist_oauth(credentials, tracks, playlist_name):
+def build_youtube_client(credentials, usage=None):
+    """
+    Build a YouTube Data API v3 client from a Google OAuth2 credentials dict.
+    
+    Every request made by the client is metered by the quota limiter, and
+    its units are charged to usage (e.g. a TransferJob) if given. The client
+    starts from the user's newest stored tokens, and a refresh made while
+    it runs is stored for later requests and transfers.
+    """
+    creds = google_credentials(youtube_credentials.current(credentials))
+    
+    # Build YouTube Data API v3 client from the cached discovery document
+    return build_youtube_service(creds, request_builder=metered_request_builder(usage))
+
+
+def create_ytm_playlist_oauth(credentials, tracks, playlist_name, progress=None,
+                              youtube=None, ytmusic=None, memo=None, manifest=None,
+                              checkpoint=None, trace=None):
     """
     Create YouTube Music playlist using OAuth credentials via YouTube Data API v3.
     This bypasses ytmusicapi's token refresh issues by using google-api-python-client directly.
     
+    Searching and inserting overlap: tracks are searched as they arrive from
+    `tracks` (a list or a lazy generator such as spotify.iter_playlist_tracks),
+    and found songs are inserted in batches while later tracks are still
+    being searched. The playlist is only created once the first song is found.
+    
     Args:
         credentials: Google OAuth2 credentials dict with token, refresh_token, etc.
-        tracks: List of track dictionaries with 'name', 'artists', 'album'
+        tracks: Iterable of spotify.Track
         playlist_name: Name for the new playlist
+        progress: Optional TransferJob updated with the current stage and counts;
+            tracks not found are reported to it one by one
+        youtube: Optional YouTube Data API client to reuse (built from credentials otherwise)
+        ytmusic: Optional YTMusic instance to reuse for searching
+        memo: Optional dict of search results shared between transfers in one job
+        manifest: Optional Manifest; its YouTube playlist is reused if it still
+            exists, and every matched, inserted or missed track is recorded in it
+        checkpoint: Optional callable run after each inserted batch to persist
+            progress, so an interrupted transfer can resume from there
+        trace: Optional Trace given spans for the playlist lookup, each search
+            and each inserted batch
     
     Returns:
-        missed_tracks: Dictionary with count and list of tracks not found
+        missed_tracks: Dictionary with the count of tracks not found, and of
+            tracks whose search kept failing (search_failed); those are left
+            out of the manifest so the next sync searches them again
+        failed_count: Number of found songs whose insert failed; these are
+            not recorded in the manifest either
     """
-    import json
-    import tempfile
     import re
     
     # Sanitize playlist name
@@ -51,142 +631,126 @@ def create_ytm_playlist_oauth(credentials, tracks, playlist_name):
     
     print(f"Original playlist name: '{playlist_name}'")
     print(f"Sanitized playlist name: '{sanitized_name}'")
-    
-    # Create Google OAuth2 Credentials object
-    # This will handle token refresh automatically
-    creds = Credentials(
-        token=credentials['token'],
-        refresh_token=credentials.get('refresh_token'),
-        token_uri=credentials.get('token_uri', 'https://oauth2.googleapis.com/token'),
-        client_id=credentials['client_id'],
-        client_secret=credentials['client_secret'],
-        scopes=credentials.get('scopes', ['https://www.googleapis.com/auth/youtube'])
-    )
-    
-    print(f"\n✓ Created Google credentials object")
-    print(f"  Token present: {bool(creds.token)}")
-    print(f"  Refresh token present: {bool(creds.refresh_token)}")
+    trace = trace or NO_TRACE
     
     try:
-        # Build YouTube Data API v3 client
-        # This will automatically refresh tokens when needed
-        youtube = build('youtube', 'v3', credentials=creds)
-        print("✓ YouTube Data API v3 client initialized\n")
+        if youtube is None:
+            youtube = build_youtube_client(credentials, usage=progress)
         
-        # Search for tracks using ytmusicapi (better for music search)
-        ytmusic_search = YTMusic()  # No auth needed for search
-        video_ids, missed_tracks = get_video_ids(ytmusic_search, tracks)
-        
-        if not video_ids:
-            raise Exception("No songs found on YouTube Music")
-        
-        # Check if playlist already exists
+        # Look up the target playlist first so inserts can start with the first found songs
+        if progress:
+            progress.set_stage('checking_existing')
         print(f"Checking if playlist '{sanitized_name}' already exists...")
         existing_playlist_id = None
         existing_video_ids = set()
+        existing_item_count = 0
         
+        playlist_index = get_playlist_index(credentials)
         try:
-            # Get user's playlists
-            playlists_request = youtube.playlists().list(
-                part='snippet',
-                mine=True,
-                maxResults=50
-            )
-            
-            while playlists_request:
-                playlists_response = playlists_request.execute()
-                
-                for playlist in playlists_response.get('items', []):
-                    if playlist['snippet']['title'] == sanitized_name:
-                        existing_playlist_id = playlist['id']
-                        print(f"✓ Found existing playlist with ID: {existing_playlist_id}")
-                        
-                        # Get existing songs in the playlist
-                        playlist_items_request = youtube.playlistItems().list(
-                            part='snippet',
-                            playlistId=existing_playlist_id,
-                            maxResults=50
-                        )
-                        
-                        while playlist_items_request:
-                            items_response = playlist_items_request.execute()
-                            for item in items_response.get('items', []):
-                                video_id = item['snippet']['resourceId']['videoId']
-                                existing_video_ids.add(video_id)
-                            
-                            playlist_items_request = youtube.playlistItems().list_next(
-                                playlist_items_request, items_response
-                            )
-                        
-                        print(f"  Found {len(existing_video_ids)} existing songs in playlist")
-                        break
-                
+            with trace.span('playlist_lookup', title=sanitized_name) as span:
+                # The per-user index avoids paging every playlist on repeat transfers
+                if manifest and playlist_index.has_playlist(youtube, manifest.youtube_playlist_id):
+                    existing_playlist_id = manifest.youtube_playlist_id
+                else:
+                    existing_playlist_id = playlist_index.find_playlist(youtube, sanitized_name)
                 if existing_playlist_id:
-                    break
-                    
-                playlists_request = youtube.playlists().list_next(
-                    playlists_request, playlists_response
-                )
+                    print(f"✓ Found existing playlist with ID: {existing_playlist_id}")
+                    existing_video_ids, existing_item_count = playlist_index.playlist_contents(
+                        youtube, existing_playlist_id
+                    )
+                    print(f"  Found {len(existing_video_ids)} existing songs in playlist")
+                    print(f"\n→ Will update existing playlist\n")
+                span['playlist_id'] = existing_playlist_id
+                span['items'] = existing_item_count
+        except QuotaExhausted:
+            raise
         except Exception as check_error:
             print(f"⚠ Error checking existing playlists: {check_error}")
         
-        # Create or use existing playlist
-        if existing_playlist_id:
-            playlist_id = existing_playlist_id
-            print(f"\n→ Will update existing playlist\n")
-        else:
-            print(f"Creating new playlist '{sanitized_name}'...")
-            playlist_request = youtube.playlists().insert(
-                part='snippet,status',
-                body={
-                    'snippet': {
-                        'title': sanitized_name,
-                        'description': 'Transferred from Spotify using StoY'
-                    },
-                    'status': {
-                        'privacyStatus': 'private'  # Can be 'public', 'private', or 'unlisted'
-                    }
-                }
+        playlist_id = existing_playlist_id
+        if manifest and playlist_id:
+            manifest.youtube_playlist_id = playlist_id
+        missed_tracks = {"count": 0, "search_failed": 0}
+        total_songs = 0
+        skipped_songs = 0
+        added_count = 0
+        failed_count = 0
+        positioned = True
+        pending = []
+        
+        def flush():
+            """Insert the pending songs, creating the playlist on first use"""
+            nonlocal playlist_id, added_count, failed_count, positioned
+            if not playlist_id:
+                print(f"Creating new playlist '{sanitized_name}'...")
+                with trace.span('create_playlist', title=sanitized_name):
+                    playlist_id = create_playlist(youtube, sanitized_name)
+                playlist_index.record_playlist(sanitized_name, playlist_id)
+                if manifest:
+                    manifest.youtube_playlist_id = playlist_id
+                print(f"✓ Playlist created with ID: {playlist_id}\n")
+            
+            def on_inserted(index, item_id):
+                if manifest:
+                    track, video_id = pending[index]
+                    manifest.record(track, video_id, item_id)
+            
+            video_ids = [video_id for _, video_id in pending]
+            added, failed, positioned = insert_playlist_items(
+                youtube, playlist_id, video_ids,
+                start_position=existing_item_count + added_count, progress=progress,
+                on_inserted=on_inserted, trace=trace, positioned=positioned
             )
-            playlist_response = playlist_request.execute()
-            playlist_id = playlist_response['id']
-            print(f"✓ Playlist created with ID: {playlist_id}\n")
+            if failed:
+                playlist_index.invalidate(playlist_id)
+            else:
+                playlist_index.record_items(playlist_id, video_ids)
+            added_count += added
+            failed_count += failed
+            pending.clear()
+            if checkpoint:
+                checkpoint()
         
-        # Add songs to playlist using YouTube Data API v3
-        # Only add songs that aren't already in the playlist
-        new_video_ids = [vid for vid in video_ids if vid not in existing_video_ids]
-        total_songs = len(video_ids)
-        new_songs = len(new_video_ids)
-        skipped_songs = len(existing_video_ids & set(video_ids))
+        # Search for tracks using ytmusicapi (better for music search)
+        if progress:
+            progress.set_stage('transferring', tracks_total=len(tracks) if hasattr(tracks, '__len__') else None)
+        ytmusic_search = ytmusic or get_ytmusic()  # Shared, no auth needed for search
         
-        if new_songs == 0:
-            print(f"✓ All {total_songs} songs already exist in the playlist. No new songs to add.\n")
-        else:
-            print(f"Adding {new_songs} new songs to playlist (skipping {skipped_songs} already present)...")
+        for track, video_id in search_pipeline(ytmusic_search, tracks, cache=get_match_cache(), memo=memo, trace=trace):
+            if video_id is SEARCH_FAILED:
+                missed_tracks["search_failed"] += 1
+                if progress:
+                    progress.track_search_failed(track.label)
+                continue
+            if not video_id:
+                missed_tracks["count"] += 1
+                if progress:
+                    progress.track_searched(track.label)
+                if manifest:
+                    manifest.record(track, None)
+                continue
             
-            added_count = 0
-            failed_count = 0
-            
-            for i, video_id in enumerate(new_video_ids, 1):
-                try:
-                    youtube.playlistItems().insert(
-                        part='snippet',
-                        body={
-                            'snippet': {
-                                'playlistId': playlist_id,
-                                'resourceId': {
-                                    'kind': 'youtube#video',
-                                    'videoId': video_id
-                                }
-                            }
-                        }
-                    ).execute()
-                    added_count += 1
-                    if i % 10 == 0:
-                        print(f"  Progress: {i}/{new_songs} new songs added...")
-                except Exception as add_error:
-                    print(f"  ⚠ Failed to add video {video_id}: {str(add_error)}")
-                    failed_count += 1
+            if progress:
+                progress.track_searched(track=track.label, video_id=video_id)
+            total_songs += 1
+            # Only add songs that aren't already in the playlist
+            if video_id in existing_video_ids:
+                skipped_songs += 1
+                if manifest:
+                    manifest.record(track, video_id)
+                continue
+            pending.append((track, video_id))
+            if len(pending) >= INSERT_BATCH_SIZE:
+                flush()
+        
+        if pending:
+            flush()
+        
+        print(f"Found {total_songs} songs on YouTube Music")
+        if total_songs == 0 and not (manifest and manifest.has_matches()):
+            raise Exception(_nothing_found_message(missed_tracks))
+        if added_count + failed_count == 0:
+            print(f"✓ All {total_songs} songs already exist in the playlist. No new songs to add.\n")
         
         print(f"\n{'='*60}")
         if existing_playlist_id:
@@ -204,13 +768,16 @@ def create_ytm_playlist_oauth(credentials, tracks, playlist_name):
         if failed_count > 0:
             print(f"Failed to add: {failed_count}")
         print(f"Not found on YouTube: {missed_tracks['count']}")
+        if missed_tracks["search_failed"]:
+            print(f"Search failed (retried next sync): {missed_tracks['search_failed']}")
+        if progress:
+            print(f"YouTube API quota used so far: {progress.quota_units} units")
         print(f"{'='*60}\n")
         
-        return missed_tracks
+        return missed_tracks, failed_count
         
     except Exception as e:
         print(f"\n❌ Error in create_ytm_playlist_oauth: {e}")
         import traceback
         traceback.print_exc()
         raise
-
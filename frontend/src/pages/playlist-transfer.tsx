@@ -23,26 +23,96 @@ interface Playlist {
     description: string;
     tracks_total: number;
     image_url: string | null;
-    owner: string;
-    public: boolean;
 }
 
+// Playlists are listed a page at a time, with only the fields shown on the cards
+const PLAYLIST_PAGE_SIZE = 60;
+const PLAYLIST_FIELDS = "id,name,description,tracks_total,image_url";
+
 interface MissedTracks {
+    jobId: string;
     count: number;
     tracks: string[];
 }
 
+// Missed tracks are listed a page at a time; huge playlists can miss thousands
+const MISSED_PAGE_SIZE = 100;
+
+interface TransferJob {
+    job_id: string;
+    status: "queued" | "running" | "completed" | "failed" | "quota_exhausted" | "interrupted";
+    stage: string;
+    tracks_total: number;
+    tracks_searched: number;
+    tracks_inserted: number;
+    tracks_search_failed: number;
+    rate: number;
+    eta_seconds: number | null;
+    missed_tracks: { count: number };
+    error: string | null;
+}
+
+const formatEta = (seconds: number) =>
+    seconds >= 60 ? `${Math.ceil(seconds / 60)}m left` : `${seconds}s left`;
+
+const describeProgress = (job: TransferJob | null) => {
+    if (!job) return "Transferring...";
+    if (job.stage !== "transferring") return "Transferring...";
+    // Searching and adding run side by side, so show both counts
+    let counts = `Found ${job.tracks_searched}/${job.tracks_total} · Added ${job.tracks_inserted}`;
+    // Searches that kept failing are retried on the next sync, not counted as missing
+    if (job.tracks_search_failed) counts += ` · ${job.tracks_search_failed} searches failed`;
+    return job.eta_seconds != null ? `${counts} · ${formatEta(job.eta_seconds)}` : counts;
+};
+
+// Follow a transfer job over Server-Sent Events until it ends
+const watchTransferJob = (jobId: string, onProgress: (job: TransferJob) => void) =>
+    new Promise<TransferJob>((resolve, reject) => {
+        const source = new EventSource(`${API_URL}/transfer/jobs/${jobId}/events`, {
+            withCredentials: true,
+        });
+        let latest: TransferJob | null = null;
+        source.addEventListener("progress", (event) => {
+            latest = { ...latest, ...JSON.parse((event as MessageEvent).data) } as TransferJob;
+            onProgress(latest);
+        });
+        source.addEventListener("end", (event) => {
+            source.close();
+            resolve(JSON.parse((event as MessageEvent).data));
+        });
+        source.onerror = () => {
+            // EventSource reconnects on its own unless the server refused the stream
+            if (source.readyState === EventSource.CLOSED) {
+                reject(new Error("Transfer job not found"));
+            }
+        };
+    });
+
+const fetchMissedTracks = async (jobId: string, offset: number) => {
+    const res = await fetch(
+        `${API_URL}/transfer/jobs/${jobId}/missed?offset=${offset}&limit=${MISSED_PAGE_SIZE}`,
+        { credentials: "include" }
+    );
+    if (!res.ok) throw new Error("Failed to fetch missed tracks");
+    return (await res.json()) as { count: number; offset: number; tracks: string[] };
+};
+
 export default function PlaylistTransfer() {
     const { toast } = useToast();
     const [spotifyConnected, setSpotifyConnected] = useState(false);
     const [youtubeConnected, setYoutubeConnected] = useState(false);
     const [playlists, setPlaylists] = useState<Playlist[]>([]);
     const [loading, setLoading] = useState(false);
+    const [playlistsCursor, setPlaylistsCursor] = useState<string | null>(null);
+    const [playlistsTotal, setPlaylistsTotal] = useState(0);
+    const [loadingMorePlaylists, setLoadingMorePlaylists] = useState(false);
     const [transferring, setTransferring] = useState<string | null>(null);
+    const [transferJob, setTransferJob] = useState<TransferJob | null>(null);
     const [error, setError] = useState<string>("");
     const [showError, setShowError] = useState(false);
     const [missedTracks, setMissedTracks] = useState<MissedTracks | null>(null);
     const [showMissedTracks, setShowMissedTracks] = useState(false);
+    const [loadingMissedTracks, setLoadingMissedTracks] = useState(false);
     const [showSuccess, setShowSuccess] = useState(false);
     const [starCount, setStarCount] = useState<number | null>(null);
     const [transferSummary, setTransferSummary] = useState<{
@@ -140,28 +210,49 @@ export default function PlaylistTransfer() {
         window.location.href = `${API_URL}/auth/youtube`;
     };
 
+    const fetchPlaylistsPage = async (cursor: string | null) => {
+        const params = new URLSearchParams({ limit: String(PLAYLIST_PAGE_SIZE), fields: PLAYLIST_FIELDS });
+        if (cursor) params.set("cursor", cursor);
+        // The browser revalidates with the ETag, so an unchanged page comes back as a cheap 304
+        const res = await fetch(`${API_URL}/playlists?${params}`, {
+            credentials: "include",
+        });
+        const data = await res.json();
+        if (!res.ok) throw new Error(data.error || "Failed to fetch playlists");
+        return data as { playlists: Playlist[]; total: number; next_cursor: string | null };
+    };
+
     const fetchPlaylists = async () => {
         setLoading(true);
         try {
-            const res = await fetch(`${API_URL}/playlists`, {
-                credentials: "include",
-            });
-            const data = await res.json();
-
-            if (res.ok) {
-                setPlaylists(data.playlists);
-            } else {
-                setError(data.error || "Failed to fetch playlists");
-                setShowError(true);
-            }
+            const page = await fetchPlaylistsPage(null);
+            setPlaylists(page.playlists);
+            setPlaylistsTotal(page.total);
+            setPlaylistsCursor(page.next_cursor);
         } catch (err) {
-            setError("Network error while fetching playlists");
+            setError(err instanceof TypeError ? "Network error while fetching playlists" : (err as Error).message);
             setShowError(true);
         } finally {
             setLoading(false);
         }
     };
 
+    const loadMorePlaylists = async () => {
+        if (!playlistsCursor) return;
+        setLoadingMorePlaylists(true);
+        try {
+            const page = await fetchPlaylistsPage(playlistsCursor);
+            setPlaylists([...playlists, ...page.playlists]);
+            setPlaylistsTotal(page.total);
+            setPlaylistsCursor(page.next_cursor);
+        } catch (err) {
+            setError(err instanceof TypeError ? "Network error while fetching playlists" : (err as Error).message);
+            setShowError(true);
+        } finally {
+            setLoadingMorePlaylists(false);
+        }
+    };
+
     const transferPlaylist = async (playlistId: string) => {
         if (!youtubeConnected) {
             setError("Please connect to YouTube Music first");
@@ -172,15 +263,24 @@ export default function PlaylistTransfer() {
         setTransferring(playlistId);
         try {
             const playlist = playlists.find(p => p.id === playlistId);
-            const res = await fetch(`${API_URL}/transfer/${playlistId}`, {
+            const startRes = await fetch(`${API_URL}/transfer/${playlistId}`, {
                 method: "POST",
                 credentials: "include",
             });
-            const data = await res.json();
+            const startData = await startRes.json();
+
+            if (!startRes.ok) {
+                setError(startData.error || "Failed to transfer playlist");
+                setShowError(true);
+                return;
+            }
 
-            if (res.ok) {
+            // Live progress from the background job until it finishes
+            const job = await watchTransferJob(startData.job_id, setTransferJob);
+
+            if (job.status === "completed") {
                 const totalTracks = playlist?.tracks_total || 0;
-                const missedCount = data.missed_tracks?.count || 0;
+                const missedCount = job.missed_tracks?.count || 0;
                 const successfulTracks = totalTracks - missedCount;
 
                 setTransferSummary({
@@ -189,14 +289,15 @@ export default function PlaylistTransfer() {
                     successfulTracks,
                 });
 
-                if (data.missed_tracks && data.missed_tracks.count > 0) {
-                    setMissedTracks(data.missed_tracks);
+                if (job.missed_tracks && job.missed_tracks.count > 0) {
+                    const page = await fetchMissedTracks(job.job_id, 0);
+                    setMissedTracks({ jobId: job.job_id, count: page.count, tracks: page.tracks });
                     setShowMissedTracks(true);
                 } else {
                     setShowSuccess(true);
                 }
             } else {
-                setError(data.error || "Failed to transfer playlist");
+                setError(job.error || "Failed to transfer playlist");
                 setShowError(true);
             }
         } catch (err) {
@@ -204,6 +305,24 @@ export default function PlaylistTransfer() {
             setShowError(true);
         } finally {
             setTransferring(null);
+            setTransferJob(null);
+        }
+    };
+
+    const loadMoreMissedTracks = async () => {
+        if (!missedTracks) return;
+        setLoadingMissedTracks(true);
+        try {
+            const page = await fetchMissedTracks(missedTracks.jobId, missedTracks.tracks.length);
+            setMissedTracks({ ...missedTracks, tracks: [...missedTracks.tracks, ...page.tracks] });
+        } catch (err) {
+            toast({
+                variant: "destructive",
+                title: "Could not load more tracks",
+                description: "Please try again.",
+            });
+        } finally {
+            setLoadingMissedTracks(false);
         }
     };
 
@@ -373,7 +492,7 @@ export default function PlaylistTransfer() {
                                                         >
                                                             {transferring ===
                                                             playlist.id
-                                                                ? "Transferring..."
+                                                                ? describeProgress(transferJob)
                                                                 : "Transfer"}
                                                         </Button>
                                                     </div>
@@ -396,6 +515,19 @@ export default function PlaylistTransfer() {
                                     ))}
                                 </div>
                             )}
+                            {!loading && playlistsCursor && (
+                                <div className="flex justify-center mt-6">
+                                    <Button
+                                        variant="outline"
+                                        onClick={loadMorePlaylists}
+                                        disabled={loadingMorePlaylists}
+                                    >
+                                        {loadingMorePlaylists
+                                            ? "Loading..."
+                                            : `Show more (${playlistsTotal - playlists.length} left)`}
+                                    </Button>
+                                </div>
+                            )}
                         </div>
                     )}
                 </div>
@@ -554,6 +686,18 @@ export default function PlaylistTransfer() {
                                     </div>
                                 );
                             })}
+                            {missedTracks && missedTracks.tracks.length < missedTracks.count && (
+                                <Button
+                                    variant="outline"
+                                    onClick={loadMoreMissedTracks}
+                                    disabled={loadingMissedTracks}
+                                    className="w-full"
+                                >
+                                    {loadingMissedTracks
+                                        ? "Loading..."
+                                        : `Show more (${missedTracks.count - missedTracks.tracks.length} left)`}
+                                </Button>
+                            )}
                         </div>
                     </div>
                     <AlertDialogFooter className="flex-shrink-0">